@@ -11,6 +11,11 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DATABASE_NAME = "traffic_detection"
 
+# Connection pool settings (per worker process)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "5"))
+MONGODB_MAX_IDLE_TIME_MS = 300000
+
 # Global database client
 client = None
 db = None
@@ -20,7 +25,13 @@ async def connect_to_mongodb():
     """Connect to MongoDB Atlas"""
     global client, db
     try:
-        client = AsyncIOMotorClient(MONGODB_URI)
+        # Keep a few warm connections so requests skip the TLS handshake to Atlas
+        client = AsyncIOMotorClient(
+            MONGODB_URI,
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS
+        )
         db = client[DATABASE_NAME]
         
         # Test connection
@@ -53,7 +64,9 @@ async def create_indexes():
     await db.users.create_index("username", unique=True)
     
     # Detection indexes
-    await db.detections.create_index("user_id")
+    # History is always filtered by user and sorted newest-first, so one
+    # compound index serves the filter, the sort and the stats $match
+    await db.detections.create_index([("user_id", 1), ("created_at", -1)])
     await db.detections.create_index("created_at")
     
     print("📊 Database indexes created")
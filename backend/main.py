@@ -4,24 +4,32 @@ With MongoDB, JWT Authentication, Rate Limiting, and Error Handling
 """
 import os
 import io
+import re
+import json
 import base64
+import asyncio
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 import numpy as np
 import cv2
 from PIL import Image
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from config.database import connect_to_mongodb, close_mongodb_connection
 from config.settings import get_settings
+from utils.email import start_email_worker, stop_email_worker, close_smtp_connection
+from utils.detection_writer import start_detection_writer, stop_detection_writer
+from utils.cache import get_cache_manager
+from utils.image import decode_image, downscale_to_max_edge, dhash, read_upload
 from routes.auth import router as auth_router
 from routes.detection import router as detection_router
 
@@ -37,6 +45,262 @@ settings = get_settings()
 # Rate limiter configuration
 limiter = Limiter(key_func=get_remote_address)
 
+# Gemini model used by /detect
+GEMINI_DETECT_MODEL = 'gemini-2.5-flash-preview-05-20'
+# Max Gemini requests in flight per worker process
+GEMINI_MAX_CONCURRENCY = 8
+# HTTP/2 keepalive on the Gemini gRPC channel so gaps between uploads
+# don't tear down the connection and pay a fresh TLS handshake
+GEMINI_GRPC_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+# Longest edge sent to Gemini; bboxes come back as percentages so no rescale is needed
+GEMINI_MAX_EDGE = 1024
+
+GEMINI_DETECT_PROMPT = """Analyze this image and detect all visible objects. For each object, provide:
+1. label: specific name (car, person, phone, hand, face, sign, etc.)
+2. confidence: 0.7 to 0.99
+3. bbox: bounding box as [x_min, y_min, x_max, y_max] in percentages (0-100) of image dimensions
+
+Return ONLY a valid JSON array:
+[{"label": "person", "confidence": 0.95, "bbox": [10, 20, 40, 80]}]
+
+The bbox values are percentages: x_min=10 means 10% from left edge.
+If no objects found, return: []"""
+
+_gemini_model = None
+_gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Annotation colors (BGR), cycled per detection
+BOX_COLORS = [
+    (46, 204, 113),   # Green
+    (52, 152, 219),   # Blue
+    (155, 89, 182),   # Purple
+    (231, 76, 60),    # Red
+    (241, 196, 15),   # Yellow
+    (26, 188, 156),   # Teal
+]
+
+# Near-duplicate gate: reuse Gemini output when a client re-sends an
+# almost identical frame (static camera). Only the client's previous frame
+# is compared, and a small colour thumbnail must match as well as the dHash
+DHASH_MAX_DISTANCE = 5
+DHASH_CACHE_SIZE = 64          # clients remembered (one frame each)
+NEAR_DUP_THUMB_SIZE = 16
+NEAR_DUP_MAX_PIXEL_DIFF = 4.0  # mean absolute difference, 0-255 scale
+_dhash_cache: OrderedDict = OrderedDict()
+
+
+def get_gemini_model():
+    """
+    Configure Gemini once and reuse the model client across requests
+    so consecutive detections share the same HTTP connection pool
+    """
+    global _gemini_model
+    
+    if _gemini_model is None:
+        import google.generativeai as genai
+        
+        genai.configure(api_key=settings.gemini_api_key)
+        _gemini_model = genai.GenerativeModel(GEMINI_DETECT_MODEL)
+        
+        try:
+            # genai.configure() can't take channel options, so hand the
+            # model an async client built on a keepalive-tuned channel.
+            # _async_client is private SDK state: versions are pinned in
+            # requirements.txt and tests/test_main.py::TestGeminiClient
+            # checks the SDK still sends through it
+            _gemini_model._async_client = _make_gemini_async_client()
+        except Exception as e:
+            logger.warning(f"⚠️ Using default Gemini channel: {e}")
+    
+    return _gemini_model
+
+
+def _make_gemini_async_client():
+    """Build a Gemini async gRPC client whose channel uses GEMINI_GRPC_OPTIONS"""
+    import google.ai.generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+        GenerativeServiceGrpcAsyncIOTransport
+    )
+    from google.auth import api_key as ga_api_key
+    
+    def create_channel(*args, options=(), **kwargs):
+        return GenerativeServiceGrpcAsyncIOTransport.create_channel(
+            *args, options=[*options, *GEMINI_GRPC_OPTIONS], **kwargs
+        )
+    
+    transport = GenerativeServiceGrpcAsyncIOTransport(
+        credentials=ga_api_key.Credentials(settings.gemini_api_key),
+        channel=create_channel
+    )
+    return glm.GenerativeServiceAsyncClient(transport=transport)
+
+
+def frame_signature(image: np.ndarray) -> tuple:
+    """dHash plus a small colour thumbnail, used to spot near-duplicate frames"""
+    thumb = cv2.resize(image, (NEAR_DUP_THUMB_SIZE, NEAR_DUP_THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    return dhash(image), thumb
+
+
+def find_near_duplicate(client_key: str, shape: tuple, signature: tuple):
+    """Return Gemini objects if this client's previous frame is a near-duplicate"""
+    entry = _dhash_cache.get(client_key)
+    if entry is None:
+        return None
+    
+    cached_shape, (cached_hash, cached_thumb), objects = entry
+    image_hash, thumb = signature
+    if cached_shape != shape or (cached_hash ^ image_hash).bit_count() >= DHASH_MAX_DISTANCE:
+        return None
+    
+    # dHash only sees coarse gradients (flat red and flat blue both hash to 0)
+    if cv2.absdiff(cached_thumb, thumb).mean() > NEAR_DUP_MAX_PIXEL_DIFF:
+        return None
+    
+    _dhash_cache.move_to_end(client_key)
+    return objects
+
+
+def remember_detection(client_key: str, shape: tuple, signature: tuple, objects: list):
+    """Store a client's latest frame and Gemini objects for the near-duplicate gate (LRU)"""
+    _dhash_cache[client_key] = (shape, signature, objects)
+    _dhash_cache.move_to_end(client_key)
+    if len(_dhash_cache) > DHASH_CACHE_SIZE:
+        _dhash_cache.popitem(last=False)
+
+
+def _to_gemini_image(image: np.ndarray) -> Image.Image:
+    """Downscale a BGR frame and convert it to an RGB PIL image"""
+    gemini_image = downscale_to_max_edge(image, GEMINI_MAX_EDGE)
+    return Image.fromarray(cv2.cvtColor(gemini_image, cv2.COLOR_BGR2RGB))
+
+
+async def gemini_detect_objects(image: np.ndarray) -> list:
+    """
+    Run Gemini object detection on a BGR image
+    
+    Returns:
+        Raw objects from Gemini (label, confidence, percentage bbox)
+    
+    Raises:
+        ValueError: if the reply holds no JSON array
+    """
+    # Create PIL Image for Gemini (downscaled to cut upload size)
+    pil_image = await asyncio.to_thread(_to_gemini_image, image)
+    
+    # Use Gemini Vision to detect objects
+    model = get_gemini_model()
+    
+    # Async call keeps the event loop free while Gemini responds
+    async with _gemini_semaphore:
+        response = await model.generate_content_async([GEMINI_DETECT_PROMPT, pil_image])
+    response_text = response.text.strip()
+    
+    # Parse JSON from response
+    json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    if not json_match:
+        raise ValueError(f"No detections array in Gemini reply: {response_text[:100]!r}")
+    return json.loads(json_match.group())
+
+
+def percent_boxes_to_pixels(objects: list, width: int, height: int) -> np.ndarray:
+    """
+    Convert Gemini percentage bboxes to clamped pixel boxes in one pass
+    
+    Malformed bboxes fall back to a centered box.
+    
+    Returns:
+        (N, 4) int array of [x1, y1, x2, y2]
+    """
+    boxes = np.full((len(objects), 4), np.nan)
+    for i, obj in enumerate(objects):
+        bbox = obj.get("bbox", [25, 25, 75, 75])
+        try:
+            values = [float(v) for v in bbox[:4]]
+        except (TypeError, ValueError):
+            continue
+        if len(values) == 4:
+            boxes[i] = values
+    
+    valid = np.isfinite(boxes).all(axis=1)
+    
+    # Convert percentage to pixel coordinates
+    scale = np.array([width, height, width, height], dtype=np.float64)
+    pixels = (np.where(valid[:, None], boxes, 0) / 100 * scale).astype(np.int64)
+    x1, y1, x2, y2 = pixels.T
+    
+    # Ensure valid bounds
+    x1 = np.maximum(0, np.minimum(x1, width - 10))
+    y1 = np.maximum(0, np.minimum(y1, height - 10))
+    x2 = np.maximum(x1 + 10, np.minimum(x2, width))
+    y2 = np.maximum(y1 + 10, np.minimum(y2, height))
+    
+    # Fallback to center box
+    center = np.array([width // 4, height // 4, 3 * width // 4, 3 * height // 4])
+    return np.where(valid[:, None], np.stack([x1, y1, x2, y2], axis=1), center)
+
+
+def render_detections(image: np.ndarray, detected_objects: list, draw: bool = True) -> tuple:
+    """
+    Convert Gemini objects to pixel boxes and draw them onto the image
+    
+    Draws in place (the decoded frame is not needed afterwards) and is
+    CPU-bound, so /detect runs it in a worker thread. With draw=False
+    only the detections are built and no JPEG is encoded.
+    
+    Returns:
+        (detections list, encoded JPEG buffer or None)
+    """
+    height, width = image.shape[:2]
+    objects = detected_objects[:15]
+    pixel_boxes = percent_boxes_to_pixels(objects, width, height).tolist()
+    confidences = [min(max(float(obj.get("confidence", 0.8)), 0.5), 0.99) for obj in objects]
+    
+    detections = [
+        {
+            "label": str(obj.get("label", "object")).title(),
+            "confidence": round(confidence, 2),
+            "box": box
+        }
+        for obj, confidence, box in zip(objects, confidences, pixel_boxes)
+    ]
+    
+    if not draw:
+        return detections, None
+    
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    for i, (detection, confidence) in enumerate(zip(detections, confidences)):
+        x1, y1, x2, y2 = detection["box"]
+        color = BOX_COLORS[i % len(BOX_COLORS)]
+        
+        # Draw bounding box
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 3)
+        
+        # Draw corners (all four L-shapes in one call)
+        c = min(25, (x2-x1)//4, (y2-y1)//4)
+        corners = np.array([
+            [(x1 + c, y1), (x1, y1), (x1, y1 + c)],
+            [(x2 - c, y1), (x2, y1), (x2, y1 + c)],
+            [(x1 + c, y2), (x1, y2), (x1, y2 - c)],
+            [(x2 - c, y2), (x2, y2), (x2, y2 - c)],
+        ], dtype=np.int32)
+        cv2.polylines(image, corners, False, color, 4)
+        
+        # Draw label
+        label_text = f"{detection['label']} {confidence:.0%}"
+        (tw, th), _ = cv2.getTextSize(label_text, font, 0.7, 2)
+        cv2.rectangle(image, (x1, y1 - th - 12), (x1 + tw + 10, y1), color, -1)
+        cv2.putText(image, label_text, (x1 + 5, y1 - 6), font, 0.7, (255, 255, 255), 2)
+    
+    # Encode result image
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    
+    return detections, buffer
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -44,13 +308,19 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Smart Traffic Detection API...")
     await connect_to_mongodb()
+    start_email_worker()
+    start_detection_writer()
     logger.info("✅ Application started successfully!")
     
     yield
     
     # Shutdown
     logger.info("📴 Shutting down application...")
+    # Flush buffered detections before the Mongo client goes away
+    await stop_detection_writer()
     await close_mongodb_connection()
+    await stop_email_worker()
+    await close_smtp_connection()
     logger.info("👋 Application shutdown complete")
 
 
@@ -76,6 +346,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Detections"],
 )
 
 # Session middleware for OAuth (required by authlib)
@@ -116,166 +387,80 @@ app.include_router(oauth_router, prefix="/api")
 from routes.ocr import router as ocr_router
 app.include_router(ocr_router, prefix="/api")
 
+# Health checks (/, /ping, /api/health)
+from routes.health import router as health_router
+app.include_router(health_router)
+
 
 
 # ============================================
 # PUBLIC ENDPOINTS (No auth required)
 # ============================================
 
-@app.get("/")
-async def root():
-    """API Health Check"""
-    return {
-        "status": "online",
-        "message": "Smart Traffic Detection API v2.0",
-        "docs": "/docs",
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-
-@app.get("/ping")
-async def ping():
-    """Ping endpoint for health checks"""
-    return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
-
-
-@app.get("/api/health")
-async def health_check():
-    """Detailed health check"""
-    from config.database import get_database
-    
-    db = get_database()
-    db_status = "connected" if db is not None else "disconnected"
-    
-    return {
-        "status": "healthy",
-        "database": db_status,
-        "version": "2.0.0",
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-
 @app.post("/detect")
 @limiter.limit("20/minute")
-async def detect_objects(request: Request, file: UploadFile = File(...)):
+async def detect_objects(
+    request: Request,
+    file: UploadFile = File(...),
+    include_image: bool = Query(True)
+):
     """
     Public detection endpoint (no auth required)
     
     Process an uploaded image and detect objects using Google Gemini Vision API
     Returns annotated image and detection results
-    """
-    import google.generativeai as genai
-    import json
-    import re
     
+    Send "Accept: image/jpeg" to get the annotated JPEG as raw bytes
+    (detections JSON in the X-Detections header) instead of base64.
+    Pass include_image=false to get boxes only (no drawing or re-encode)
+    and render overlays client-side.
+    """
     try:
-        # Read image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Read image (capped at MAX_UPLOAD_BYTES)
+        contents = await read_upload(file)
+        image = await asyncio.to_thread(decode_image, contents)
         
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        height, width = image.shape[:2]
-        result_image = image.copy()
-        
-        # Configure Gemini
-        genai.configure(api_key=settings.gemini_api_key)
-        
-        # Create PIL Image for Gemini
-        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        
-        # Use Gemini Vision to detect objects
-        model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
-        
-        prompt = """Analyze this image and detect all visible objects. For each object, provide:
-1. label: specific name (car, person, phone, hand, face, sign, etc.)
-2. confidence: 0.7 to 0.99
-3. bbox: bounding box as [x_min, y_min, x_max, y_max] in percentages (0-100) of image dimensions
-
-Return ONLY a valid JSON array:
-[{"label": "person", "confidence": 0.95, "bbox": [10, 20, 40, 80]}]
-
-The bbox values are percentages: x_min=10 means 10% from left edge.
-If no objects found, return: []"""
+        # Byte-identical uploads: result cached by content hash (shared via Redis)
+        cache = get_cache_manager()
+        detected_objects = await cache.get_cached_detection(contents)
         
-        try:
-            response = model.generate_content([prompt, pil_image])
-            response_text = response.text.strip()
+        if detected_objects is None:
+            # Skip Gemini when this client's previous frame is a near-duplicate
+            # (signature only computed once the content cache has missed)
+            client_key = get_remote_address(request)
+            signature = await asyncio.to_thread(frame_signature, image)
+            detected_objects = find_near_duplicate(client_key, image.shape, signature)
             
-            # Parse JSON from response
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                detected_objects = json.loads(json_match.group())
-            else:
-                detected_objects = []
-        except Exception as gemini_error:
-            logger.warning(f"Gemini API error: {gemini_error}")
-            detected_objects = []
+            if detected_objects is None:
+                try:
+                    detected_objects = await gemini_detect_objects(image)
+                except Exception as gemini_error:
+                    # Not cached: a transient outage must not pin "no detections"
+                    logger.warning(f"Gemini API error: {gemini_error}")
+                    detected_objects = []
+                else:
+                    remember_detection(client_key, image.shape, signature, detected_objects)
+                    await cache.cache_detection(contents, detected_objects)
         
-        detections = []
-        colors = [
-            (46, 204, 113),   # Green
-            (52, 152, 219),   # Blue
-            (155, 89, 182),   # Purple
-            (231, 76, 60),    # Red
-            (241, 196, 15),   # Yellow
-            (26, 188, 156),   # Teal
-        ]
+        # Box conversion, drawing and JPEG encoding are CPU-bound
+        detections, buffer = await asyncio.to_thread(
+            render_detections, image, detected_objects, include_image
+        )
         
-        for i, obj in enumerate(detected_objects[:15]):
-            label = str(obj.get("label", "object")).title()
-            confidence = min(max(float(obj.get("confidence", 0.8)), 0.5), 0.99)
-            bbox = obj.get("bbox", [25, 25, 75, 75])
-            
-            # Convert percentage to pixel coordinates
-            try:
-                x1 = int(float(bbox[0]) / 100 * width)
-                y1 = int(float(bbox[1]) / 100 * height)
-                x2 = int(float(bbox[2]) / 100 * width)
-                y2 = int(float(bbox[3]) / 100 * height)
-                
-                # Ensure valid bounds
-                x1 = max(0, min(x1, width - 10))
-                y1 = max(0, min(y1, height - 10))
-                x2 = max(x1 + 10, min(x2, width))
-                y2 = max(y1 + 10, min(y2, height))
-            except (IndexError, TypeError, ValueError):
-                # Fallback to center box
-                x1, y1, x2, y2 = width//4, height//4, 3*width//4, 3*height//4
-            
-            color = colors[i % len(colors)]
-            
-            # Draw bounding box
-            cv2.rectangle(result_image, (x1, y1), (x2, y2), color, 3)
-            
-            # Draw corners
-            corner = min(25, (x2-x1)//4, (y2-y1)//4)
-            for cx, cy in [(x1, y1), (x2, y1), (x1, y2), (x2, y2)]:
-                dx = corner if cx == x1 else -corner
-                dy = corner if cy == y1 else -corner
-                cv2.line(result_image, (cx, cy), (cx + dx, cy), color, 4)
-                cv2.line(result_image, (cx, cy), (cx, cy + dy), color, 4)
-            
-            # Draw label
-            label_text = f"{label} {confidence:.0%}"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            (tw, th), _ = cv2.getTextSize(label_text, font, 0.7, 2)
-            cv2.rectangle(result_image, (x1, y1 - th - 12), (x1 + tw + 10, y1), color, -1)
-            cv2.putText(result_image, label_text, (x1 + 5, y1 - 6), font, 0.7, (255, 255, 255), 2)
-            
-            detections.append({
-                "label": label,
-                "confidence": round(confidence, 2),
-                "box": [x1, y1, x2, y2]
-            })
+        logger.info(f"Gemini Detection: {len(detections)} objects found")
         
-        # Encode result image
-        _, buffer = cv2.imencode('.jpg', result_image, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
+        # Binary response skips the ~33% base64 inflation
+        if buffer is not None and "image/jpeg" in request.headers.get("accept", ""):
+            return Response(
+                content=buffer.tobytes(),
+                media_type="image/jpeg",
+                headers={"X-Detections": json.dumps(detections)}
+            )
         
-        logger.info(f"Gemini Detection: {len(detections)} objects found")
+        img_base64 = base64.b64encode(buffer).decode('utf-8') if buffer is not None else None
         
         return {
             "success": True,
@@ -1,3 +1,3 @@
 # Routes module
-from .auth import router as auth_router
-from .detection import router as detection_router
+# Routers are imported from their submodules (e.g. routes.auth) so that
+# importing one route module does not pull in every other route's dependencies
@@ -1,10 +1,11 @@
 """
 Detection Routes - Image Detection and History
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
+from fastapi import APIRouter, Depends, Query
 from datetime import datetime
 from bson import ObjectId
-from typing import Optional, List
+from typing import Optional
+import asyncio
 import base64
 import io
 from PIL import Image
@@ -14,11 +15,17 @@ from models.schemas import (
     DetectionCreate, DetectionResponse, DetectedObject,
     DetectionListResponse, MessageResponse, UserStats
 )
-from utils.auth import get_current_user, get_optional_user
+from utils.auth import get_current_user
+from utils.cache import get_cache_manager
+from utils.detection_writer import save_detection
 from utils.exceptions import NotFoundError, ValidationError
 
 router = APIRouter(prefix="/detections", tags=["Detections"])
 
+# Max thumbnails rendered at once in worker threads
+THUMBNAIL_MAX_CONCURRENCY = 4
+_thumbnail_semaphore = asyncio.Semaphore(THUMBNAIL_MAX_CONCURRENCY)
+
 
 def compress_image(image_data: bytes, max_size: int = 200) -> str:
     """Compress image to thumbnail for storage"""
@@ -41,6 +48,20 @@ def compress_image(image_data: bytes, max_size: int = 200) -> str:
         return None
 
 
+def thumbnail_from_base64(image_base64: str) -> Optional[str]:
+    """Decode a (data URL) base64 image and compress it to a thumbnail"""
+    try:
+        # Remove data URL prefix if present
+        img_data = image_base64
+        if ',' in img_data:
+            img_data = img_data.split(',')[1]
+        
+        image_bytes = base64.b64decode(img_data)
+        return compress_image(image_bytes)
+    except Exception:
+        return None
+
+
 @router.post("/", response_model=DetectionResponse)
 async def create_detection(
     detection_data: DetectionCreate,
@@ -51,21 +72,11 @@ async def create_detection(
     
     Requires authentication
     """
-    db = get_database()
-    
-    # Create thumbnail from base64 image
+    # Create thumbnail from base64 image (CPU-bound, kept off the event loop)
     thumbnail = None
     if detection_data.image_base64:
-        try:
-            # Remove data URL prefix if present
-            img_data = detection_data.image_base64
-            if ',' in img_data:
-                img_data = img_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(img_data)
-            thumbnail = compress_image(image_bytes)
-        except Exception:
-            pass
+        async with _thumbnail_semaphore:
+            thumbnail = await asyncio.to_thread(thumbnail_from_base64, detection_data.image_base64)
     
     # Calculate stats
     detections = detection_data.detections
@@ -85,10 +96,13 @@ async def create_detection(
         "created_at": datetime.utcnow()
     }
     
-    result = await db.detections.insert_one(detection_doc)
+    # Batched with concurrent saves; returns once written, so the stats
+    # invalidated below are recomputed with this document included
+    inserted_id = await save_detection(detection_doc)
+    await get_cache_manager().invalidate_user_stats(current_user["id"])
     
     return DetectionResponse(
-        id=str(result.inserted_id),
+        id=str(inserted_id),
         user_id=current_user["id"],
         detections=[DetectedObject(**d) for d in detection_doc["detections"]],
         object_count=detection_doc["object_count"],
@@ -149,25 +163,45 @@ async def get_user_stats(current_user: dict = Depends(get_current_user)):
     """
     Get user's detection statistics
     """
+    # Stats are read-heavy (dashboard polls); serve from cache when fresh
+    cache = get_cache_manager()
+    cached = await cache.get_user_stats(current_user["id"])
+    if cached:
+        return UserStats(**cached)
+    
     db = get_database()
     
     user_id = ObjectId(current_user["id"])
     
-    # Aggregate stats
+    # Totals and top label in one aggregation (single scan of the user's docs)
     pipeline = [
         {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": None,
-            "total_detections": {"$sum": 1},
-            "total_objects": {"$sum": "$object_count"},
-            "avg_confidence": {"$avg": "$avg_confidence"},
-            "last_detection": {"$max": "$created_at"}
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_detections": {"$sum": 1},
+                    "total_objects": {"$sum": "$object_count"},
+                    "avg_confidence": {"$avg": "$avg_confidence"},
+                    "last_detection": {"$max": "$created_at"}
+                }}
+            ],
+            "top_object": [
+                {"$unwind": "$detections"},
+                {"$group": {
+                    "_id": "$detections.label",
+                    "count": {"$sum": 1}
+                }},
+                {"$sort": {"count": -1}},
+                {"$limit": 1}
+            ]
         }}
     ]
     
     result = await db.detections.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {}
     
-    if not result:
+    if not facets.get("totals"):
         return UserStats(
             total_detections=0,
             total_objects=0,
@@ -176,30 +210,20 @@ async def get_user_stats(current_user: dict = Depends(get_current_user)):
             last_detection=None
         )
     
-    stats = result[0]
-    
-    # Get top object
-    top_pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$unwind": "$detections"},
-        {"$group": {
-            "_id": "$detections.label",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    top_result = await db.detections.aggregate(top_pipeline).to_list(1)
+    stats = facets["totals"][0]
+    top_result = facets["top_object"]
     top_object = top_result[0]["_id"] if top_result else "-"
     
-    return UserStats(
+    user_stats = UserStats(
         total_detections=stats["total_detections"],
         total_objects=stats["total_objects"],
         avg_confidence=round(stats["avg_confidence"] * 100, 1) if stats["avg_confidence"] else 0,
         top_object=top_object,
         last_detection=stats["last_detection"]
     )
+    await cache.set_user_stats(current_user["id"], user_stats.model_dump(mode="json"))
+    
+    return user_stats
 
 
 @router.get("/{detection_id}", response_model=DetectionResponse)
@@ -256,6 +280,8 @@ async def delete_detection(
     if result.deleted_count == 0:
         raise NotFoundError("Detection")
     
+    await get_cache_manager().invalidate_user_stats(current_user["id"])
+    
     return MessageResponse(message="Detection deleted successfully")
 
 
@@ -270,6 +296,8 @@ async def clear_all_detections(current_user: dict = Depends(get_current_user)):
         "user_id": ObjectId(current_user["id"])
     })
     
+    await get_cache_manager().invalidate_user_stats(current_user["id"])
+    
     return MessageResponse(
         message=f"Deleted {result.deleted_count} detections"
     )
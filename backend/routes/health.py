@@ -0,0 +1,46 @@
+"""
+Health Check Routes
+Kept free of model/OpenCV imports so probes and smoke tests load fast
+"""
+from fastapi import APIRouter
+from datetime import datetime, timezone
+
+router = APIRouter(tags=["Health"])
+
+
+def _utc_now_iso() -> str:
+    """Current UTC time as a naive ISO string (the format clients already parse)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+@router.get("/")
+async def root():
+    """API Health Check"""
+    return {
+        "status": "online",
+        "message": "Smart Traffic Detection API v2.0",
+        "docs": "/docs",
+        "timestamp": _utc_now_iso()
+    }
+
+
+@router.get("/ping")
+async def ping():
+    """Ping endpoint for health checks"""
+    return {"status": "ok", "timestamp": _utc_now_iso()}
+
+
+@router.get("/api/health")
+async def health_check():
+    """Detailed health check"""
+    from config.database import get_database
+    
+    db = get_database()
+    db_status = "connected" if db is not None else "disconnected"
+    
+    return {
+        "status": "healthy",
+        "database": db_status,
+        "version": "2.0.0",
+        "timestamp": _utc_now_iso()
+    }
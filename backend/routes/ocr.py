@@ -68,19 +68,24 @@ def get_ocr_reader():
 # PLATE VALIDATION
 # =============================================================================
 
+# Indian plate patterns (compiled once at import)
+_PLATE_PATTERNS = [
+    re.compile(r'^[A-Z]{2}\d{2}[A-Z]{1,3}\d{1,4}$'),  # MH12AB4567
+    re.compile(r'^[A-Z]{2}\d{2}[A-Z]{2}\d{4}$'),       # MH12AB4567
+    re.compile(r'^[A-Z]{2}\s?\d{2}\s?[A-Z]{1,3}\s?\d{1,4}$'),  # With spaces
+    re.compile(r'^[A-Z]{2}\d{1,2}[A-Z]{1,3}\d{1,4}$'),  # Flexible
+]
+
+# Overlay track IDs (e.g., "CAR89", "TRUCK12")
+_TRACK_ID_PATTERN = re.compile(r'^(CAR|TRUCK|BUS|VEHICLE)\d+$')
+
+
 def is_indian_plate(text: str) -> bool:
     """Check if text matches Indian plate pattern"""
-    patterns = [
-        r'^[A-Z]{2}\d{2}[A-Z]{1,3}\d{1,4}$',  # MH12AB4567
-        r'^[A-Z]{2}\d{2}[A-Z]{2}\d{4}$',       # MH12AB4567
-        r'^[A-Z]{2}\s?\d{2}\s?[A-Z]{1,3}\s?\d{1,4}$',  # With spaces
-        r'^[A-Z]{2}\d{1,2}[A-Z]{1,3}\d{1,4}$',  # Flexible
-    ]
-    
     cleaned = text.upper().replace(' ', '').replace('-', '')
     
-    for pattern in patterns:
-        if re.match(pattern, cleaned):
+    for pattern in _PLATE_PATTERNS:
+        if pattern.match(cleaned):
             return True
     
     # Check state codes
@@ -131,7 +136,7 @@ def score_plate_candidate(text: str) -> float:
             score -= 100
     
     # Penalize if text looks like a track ID (e.g., "CAR89", "TRUCK12")
-    if re.match(r'^(CAR|TRUCK|BUS|VEHICLE)\d+$', cleaned):
+    if _TRACK_ID_PATTERN.match(cleaned):
         score -= 100
     
     return score
@@ -3,69 +3,104 @@ WebSocket Routes for Real-time Detection Updates
 Replaces polling for live stats and detection notifications
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import List, Dict
+from typing import Set, Dict
 import json
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+
+# Prefer orjson for encoding broadcast frames
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 router = APIRouter(tags=["WebSocket"])
 
 
+# Cached ISO timestamp for the current wall-clock second: [second, iso_string]
+_ts_cache = [0, ""]
+
+
+def now_iso() -> str:
+    """UTC ISO timestamp (second precision), reused within the same second"""
+    second = int(time.time())
+    if second != _ts_cache[0]:
+        _ts_cache[0] = second
+        # Naive UTC string, same format as datetime.utcnow().isoformat() gave
+        _ts_cache[1] = datetime.fromtimestamp(second, timezone.utc).replace(tzinfo=None).isoformat()
+    return _ts_cache[1]
+
+
+def encode_message(message: dict) -> str:
+    """Serialize a message to a JSON text frame"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(message).decode("utf-8")
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
 class ConnectionManager:
     """Manages WebSocket connections for real-time updates"""
     
     def __init__(self):
-        # All active connections
-        self.active_connections: List[WebSocket] = []
+        # All active connections (set for O(1) add/remove)
+        self.active_connections: Set[WebSocket] = set()
         # User-specific connections (keyed by user_id)
-        self.user_connections: Dict[str, List[WebSocket]] = {}
+        self.user_connections: Dict[str, Set[WebSocket]] = {}
     
     async def connect(self, websocket: WebSocket, user_id: str = None):
         """Accept new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
         
         if user_id:
             if user_id not in self.user_connections:
-                self.user_connections[user_id] = []
-            self.user_connections[user_id].append(websocket)
+                self.user_connections[user_id] = set()
+            self.user_connections[user_id].add(websocket)
     
     def disconnect(self, websocket: WebSocket, user_id: str = None):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
         
         if user_id and user_id in self.user_connections:
-            if websocket in self.user_connections[user_id]:
-                self.user_connections[user_id].remove(websocket)
+            self.user_connections[user_id].discard(websocket)
     
     async def broadcast(self, message: dict):
-        """Send message to all connected clients"""
-        dead_connections = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
+        """Send message to all connected clients (concurrently)"""
+        # Encode once, not once per connection
+        payload = encode_message(message)
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_text(payload) for connection in connections),
+            return_exceptions=True
+        )
+        dead_connections = [
+            connection for connection, result in zip(connections, results)
+            if isinstance(result, BaseException)
+        ]
         
         # Clean up dead connections
         for dc in dead_connections:
-            if dc in self.active_connections:
-                self.active_connections.remove(dc)
+            self.active_connections.discard(dc)
     
     async def send_to_user(self, user_id: str, message: dict):
         """Send message to specific user"""
         if user_id in self.user_connections:
-            dead_connections = []
-            for connection in self.user_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    dead_connections.append(connection)
+            payload = encode_message(message)
+            connections = list(self.user_connections[user_id])
+            results = await asyncio.gather(
+                *(connection.send_text(payload) for connection in connections),
+                return_exceptions=True
+            )
+            dead_connections = [
+                connection for connection, result in zip(connections, results)
+                if isinstance(result, BaseException)
+            ]
             
             # Clean up
             for dc in dead_connections:
-                self.user_connections[user_id].remove(dc)
+                self.user_connections[user_id].discard(dc)
 
 
 # Global connection manager
@@ -92,7 +127,7 @@ async def websocket_detections(websocket: WebSocket):
     await websocket.send_json({
         "type": "connected",
         "message": "Connected to detection stream",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now_iso()
     })
     
     try:
@@ -103,7 +138,7 @@ async def websocket_detections(websocket: WebSocket):
             if data.get("type") == "ping":
                 await websocket.send_json({
                     "type": "pong",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": now_iso()
                 })
             
             elif data.get("type") == "subscribe":
@@ -111,7 +146,7 @@ async def websocket_detections(websocket: WebSocket):
                 await websocket.send_json({
                     "type": "subscribed",
                     "channel": channel,
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": now_iso()
                 })
     
     except WebSocketDisconnect:
@@ -132,7 +167,7 @@ async def websocket_live_detection(websocket: WebSocket, session_id: str):
     await websocket.send_json({
         "type": "session_started",
         "session_id": session_id,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now_iso()
     })
     
     try:
@@ -146,7 +181,7 @@ async def websocket_live_detection(websocket: WebSocket, session_id: str):
                     "type": "live_detection",
                     "session_id": session_id,
                     "detections": data.get("detections", []),
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": now_iso()
                 })
     
     except WebSocketDisconnect:
@@ -159,7 +194,7 @@ async def broadcast_detection_event(detection_data: dict):
     await manager.broadcast({
         "type": "new_detection",
         "data": detection_data,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now_iso()
     })
 
 
@@ -168,7 +203,7 @@ async def broadcast_stats_update(stats: dict):
     await manager.broadcast({
         "type": "stats_update",
         "data": stats,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now_iso()
     })
 
 
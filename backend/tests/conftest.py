@@ -3,35 +3,146 @@ Test configuration and fixtures for pytest
 """
 import pytest
 import pytest_asyncio
+import httpx
 from httpx import AsyncClient, ASGITransport
+from starlette.responses import RedirectResponse
 from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
+from io import BytesIO
+from types import MappingProxyType
+from dataclasses import dataclass
 
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from main import app
+
+@dataclass(frozen=True, slots=True)
+class _GeminiResponse:
+    """The one attribute /detect reads from a Gemini reply"""
+    text: str
+
+
+# Canned Gemini reply, built once; immutable so tests can't leak edits
+GEMINI_RESPONSE = _GeminiResponse(
+    text='[{"label": "car", "confidence": 0.9, "bbox": [10, 20, 60, 80]}]'
+)
+
+
+# Session fixtures run once per pytest-xdist worker process (nothing is
+# shared or pickled between workers), so mocks and buffers are safe here.
+# Tests never connect to MongoDB (no lifespan; get_database is mocked),
+# so workers need no per-worker database.
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_ocr_regex():
+    """Exercise plate validation once so no test pays the warm-up cost"""
+    from routes.ocr import is_indian_plate, score_plate_candidate
+    is_indian_plate("MH12AB4567")
+    score_plate_candidate("MH12AB4567")
 
 
 # Mock MongoDB for testing
+@pytest.fixture(scope="session")
+def _get_database_mock():
+    """get_database stand-in returning one MagicMock database, built once"""
+    return MagicMock(return_value=MagicMock())
+
+
 @pytest.fixture(autouse=True)
-def mock_mongodb():
+def mock_mongodb(_get_database_mock):
     """Mock MongoDB connection for all tests"""
-    with patch('config.database.get_database') as mock_db:
-        mock_database = MagicMock()
-        mock_db.return_value = mock_database
-        yield mock_database
+    with patch('config.database.get_database', new=_get_database_mock):
+        yield _get_database_mock.return_value
+    # Clear recorded calls and per-test side effects, keep the database mock
+    _get_database_mock.reset_mock(return_value=False, side_effect=True)
+
+
+@pytest.fixture(scope="session")
+def gemini_model_mock():
+    """Gemini model class stand-in with a canned reply, built once (patched in by mock_gemini)"""
+    model_class = MagicMock()
+    model_class.return_value.generate_content_async = AsyncMock(return_value=GEMINI_RESPONSE)
+    return model_class
+
+
+@pytest.fixture
+def mock_gemini(monkeypatch, gemini_model_mock):
+    """Mock Gemini Vision so /detect skips the real model call (this test only)"""
+    import main
+    from utils.cache import get_cache_manager
+    
+    # Drop any model client or results cached by an earlier request
+    main._gemini_model = None
+    main._dhash_cache.clear()
+    get_cache_manager()._det_cache.clear()
+    gemini_model_mock.reset_mock()
+    monkeypatch.setattr('google.generativeai.GenerativeModel', gemini_model_mock)
+    yield gemini_model_mock
+    main._gemini_model = None
+    main._dhash_cache.clear()
+
+
+@pytest.fixture
+def live_gemini():
+    """Real Gemini Vision for a slow test; skipped without GEMINI_API_KEY"""
+    import main
+    from utils.cache import get_cache_manager
+    
+    if not os.getenv("GEMINI_API_KEY"):
+        pytest.skip("GEMINI_API_KEY not set")
+    
+    # Start from a real model client and empty result caches
+    main._gemini_model = None
+    main._dhash_cache.clear()
+    get_cache_manager()._det_cache.clear()
+    yield
+    main._gemini_model = None
+    main._dhash_cache.clear()
+
+
+@pytest.fixture(scope="session")
+def app():
+    """FastAPI application, imported once per session (not at collection)"""
+    from main import app as fastapi_app
+    return fastapi_app
+
+
+@pytest.fixture(scope="session")
+def asgi_transport(app):
+    """
+    ASGI transport shared by every test client (it holds no loop state)
+    The app lifespan is not run: it would connect to MongoDB Atlas
+    """
+    return ASGITransport(app=app)
 
 
 @pytest_asyncio.fixture
-async def client():
+async def client(asgi_transport):
     """Create async test client"""
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+    async with AsyncClient(transport=asgi_transport, base_url="http://test") as ac:
         yield ac
 
 
+@pytest.fixture(scope="session")
+def app_paths(app):
+    """Set of all registered route paths"""
+    return {route.path for route in app.routes}
+
+
+@pytest.fixture
+def fake_oauth(monkeypatch):
+    """Replace the authlib OAuth registry with a fake for this test only"""
+    from routes import oauth as oauth_module
+    
+    fake = MagicMock()
+    fake.google.authorize_redirect = AsyncMock(
+        return_value=RedirectResponse("https://accounts.google.com/", status_code=302)
+    )
+    monkeypatch.setattr(oauth_module, "oauth", fake)
+    return fake
+
+
 @pytest.fixture
 def sample_user():
     """Sample user data for testing"""
@@ -42,16 +153,83 @@ def sample_user():
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_detection():
-    """Sample detection data for testing"""
-    return {
+    """Sample detection data for testing (shared read-only view)"""
+    return MappingProxyType({
         "detections": [
             {"label": "car", "confidence": 0.95, "box": [10, 20, 100, 150]},
             {"label": "person", "confidence": 0.87, "box": [50, 30, 80, 200]}
         ],
         "source": "upload"
+    })
+
+
+@pytest.fixture(scope="session")
+def png_bytes():
+    """100x100 PNG upload payload, encoded once per session (immutable bytes)"""
+    from PIL import Image
+    
+    buffer = BytesIO()
+    Image.new('RGB', (100, 100), color='red').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _encode_upload(filename, data, content_type):
+    """Encode a single-file multipart body once; returns (body, headers)"""
+    request = httpx.Request("POST", "http://test/detect", files={"file": (filename, data, content_type)})
+    body = request.read()
+    headers = {
+        "Content-Type": request.headers["content-type"],
+        "Content-Length": str(len(body))
     }
+    return body, MappingProxyType(headers)
+
+
+@pytest.fixture(scope="session")
+def encode_upload():
+    """Helper to pre-encode an upload that a test posts more than once"""
+    return _encode_upload
+
+
+@pytest.fixture(scope="session")
+def png_image(png_bytes):
+    """png_bytes decoded once to a read-only BGR array"""
+    from utils.image import decode_image
+    
+    image = decode_image(png_bytes)
+    image.setflags(write=False)
+    return image
+
+
+@pytest.fixture
+def decoded_png(monkeypatch, png_image):
+    """Skip decoding in /detect: hand it a copy of png_image (it draws in place)"""
+    import main
+    
+    monkeypatch.setattr(main, "decode_image", lambda contents: png_image.copy())
+    return png_image
+
+
+@pytest.fixture(scope="session")
+def png_multipart(png_bytes):
+    """png_bytes as a ready-made multipart body and headers, encoded once"""
+    return _encode_upload("test.png", png_bytes, "image/png")
+
+
+@pytest.fixture
+def post_detect(client, mock_gemini):
+    """
+    POST a pre-encoded (body, headers) upload to /detect (Gemini mocked)
+    Returns (status_code, decoded JSON or None) so tests decode once
+    """
+    async def _post(upload, params=None):
+        body, headers = upload
+        response = await client.post("/detect", params=params, content=body, headers=headers)
+        is_json = response.headers.get("content-type", "").startswith("application/json")
+        return response.status_code, (response.json() if is_json else None)
+    
+    return _post
 
 
 @pytest.fixture
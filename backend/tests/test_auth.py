@@ -2,46 +2,57 @@
 Unit tests for authentication endpoints
 Fixed: Updated mock targets and status code assertions
 """
+import copy
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import AsyncMock, MagicMock
+from types import SimpleNamespace
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def _build_db_template():
+    """Mock database with no existing user and a successful insert"""
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value=None)
+    db.users.insert_one = AsyncMock(return_value=SimpleNamespace(inserted_id="mock_id_123"))
+    return db
+
+
+# Configured once; each test gets an independent deep copy
+_DB_TEMPLATE = _build_db_template()
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """Fresh copy of the mock database, wired into both get_database lookups"""
+    db = copy.deepcopy(_DB_TEMPLATE)
+    monkeypatch.setattr('config.database.get_database', lambda: db)
+    monkeypatch.setattr('routes.auth.get_database', lambda: db)
+    return db
+
+
 class TestAuthRegister:
     """Tests for /api/auth/register endpoint"""
     
     @pytest.mark.asyncio
-    async def test_register_success(self, client, sample_user):
+    async def test_register_success(self, client, sample_user, mock_db):
         """Test successful user registration"""
-        mock_db = MagicMock()
-        mock_db.users.find_one = AsyncMock(return_value=None)
-        mock_db.users.insert_one = AsyncMock(
-            return_value=MagicMock(inserted_id="mock_id_123")
-        )
-        
-        with patch('config.database.get_database', return_value=mock_db):
-            with patch('routes.auth.get_database', return_value=mock_db):
-                response = await client.post("/api/auth/register", json=sample_user)
-        
-        # Should return 200 or 201 with token
-        assert response.status_code in [200, 201, 422]
+        response = await client.post("/api/auth/register", json=sample_user)
+        
+        # Should return a token
+        assert response.status_code == 200
+        assert "access_token" in response.json()
     
     @pytest.mark.asyncio
-    async def test_register_duplicate_email(self, client, sample_user):
+    async def test_register_duplicate_email(self, client, sample_user, mock_db):
         """Test registration with existing email"""
-        mock_db = MagicMock()
-        mock_db.users.find_one = AsyncMock(
-            return_value={"email": sample_user["email"]}
-        )
+        mock_db.users.find_one.return_value = {"email": sample_user["email"]}
         
-        with patch('config.database.get_database', return_value=mock_db):
-            with patch('routes.auth.get_database', return_value=mock_db):
-                response = await client.post("/api/auth/register", json=sample_user)
+        response = await client.post("/api/auth/register", json=sample_user)
         
-        # Should fail with 400 or similar
-        assert response.status_code in [400, 409, 422]
+        # Should fail with a conflict
+        assert response.status_code == 409
     
     @pytest.mark.asyncio
     async def test_register_invalid_email(self, client):
@@ -76,69 +87,59 @@ class TestAuthLogin:
     """Tests for /api/auth/login endpoint"""
     
     @pytest.mark.asyncio
-    async def test_login_success(self, client, sample_user):
+    async def test_login_success(self, client, sample_user, mock_db):
         """Test successful login"""
         from datetime import datetime
         hashed = pwd_context.hash(sample_user["password"])
         
-        mock_db = MagicMock()
-        mock_db.users.find_one = AsyncMock(return_value={
+        mock_db.users.find_one.return_value = {
             "_id": "mock_id",
             "email": sample_user["email"],
             "username": sample_user["username"],
             "hashed_password": hashed,
             "is_active": True,
             "created_at": datetime.utcnow()  # Use proper datetime object
-        })
+        }
         
-        with patch('config.database.get_database', return_value=mock_db):
-            with patch('routes.auth.get_database', return_value=mock_db):
-                response = await client.post("/api/auth/login", json={
-                    "email": sample_user["email"],
-                    "password": sample_user["password"]
-                })
+        response = await client.post("/api/auth/login", json={
+            "email": sample_user["email"],
+            "password": sample_user["password"]
+        })
         
         # Should succeed with token
-        assert response.status_code in [200, 422]
+        assert response.status_code == 200
+        assert "access_token" in response.json()
     
     @pytest.mark.asyncio
-    async def test_login_wrong_password(self, client, sample_user):
+    async def test_login_wrong_password(self, client, sample_user, mock_db):
         """Test login with wrong password"""
         hashed = pwd_context.hash("correct_password")
         
-        mock_db = MagicMock()
-        mock_db.users.find_one = AsyncMock(return_value={
+        mock_db.users.find_one.return_value = {
             "_id": "mock_id",
             "email": sample_user["email"],
             "hashed_password": hashed,
             "is_active": True
-        })
+        }
         
-        with patch('config.database.get_database', return_value=mock_db):
-            with patch('routes.auth.get_database', return_value=mock_db):
-                response = await client.post("/api/auth/login", json={
-                    "email": sample_user["email"],
-                    "password": "wrong_password"
-                })
+        response = await client.post("/api/auth/login", json={
+            "email": sample_user["email"],
+            "password": "wrong_password"
+        })
         
         # Should fail with 401
-        assert response.status_code in [401, 400, 422]
+        assert response.status_code == 401
     
     @pytest.mark.asyncio
-    async def test_login_nonexistent_user(self, client):
+    async def test_login_nonexistent_user(self, client, mock_db):
         """Test login with non-existent email"""
-        mock_db = MagicMock()
-        mock_db.users.find_one = AsyncMock(return_value=None)
-        
-        with patch('config.database.get_database', return_value=mock_db):
-            with patch('routes.auth.get_database', return_value=mock_db):
-                response = await client.post("/api/auth/login", json={
-                    "email": "nonexistent@example.com",
-                    "password": "password123"
-                })
-        
-        # Should fail with 401 or 404
-        assert response.status_code in [401, 404, 422]
+        response = await client.post("/api/auth/login", json={
+            "email": "nonexistent@example.com",
+            "password": "password123"
+        })
+        
+        # Should fail with 401 (same as a wrong password)
+        assert response.status_code == 401
 
 
 class TestAuthProfile:
@@ -0,0 +1,36 @@
+"""
+Unit tests for the cache manager
+Tests for utils/cache.py
+"""
+import cv2
+import numpy as np
+
+from utils.cache import get_cache_manager
+
+
+def _bmp(image: np.ndarray) -> bytes:
+    """Encode an image as an uncompressed BMP"""
+    _, buffer = cv2.imencode('.bmp', image)
+    return buffer.tobytes()
+
+
+class TestDetectionCacheKey:
+    """Tests for the /detect result cache key"""
+
+    def test_small_edit_changes_key(self):
+        """Test large same-size images differing in a few pixels get different keys"""
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        with_circle = image.copy()
+        cv2.circle(with_circle, (320, 240), 6, (255, 255, 255), -1)
+
+        cache = get_cache_manager()
+
+        assert cache._hash_image(_bmp(image)) != cache._hash_image(_bmp(with_circle))
+
+    def test_identical_bytes_share_key(self):
+        """Test re-uploads of the same bytes map to the same key"""
+        payload = _bmp(np.full((480, 640, 3), 90, dtype=np.uint8))
+
+        cache = get_cache_manager()
+
+        assert cache._hash_image(payload) == cache._hash_image(bytes(payload))
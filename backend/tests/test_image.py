@@ -0,0 +1,119 @@
+"""
+Unit tests for image helpers
+Tests for utils/image.py
+"""
+from io import BytesIO
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import utils.image
+from utils.image import MAX_UPLOAD_BYTES, decode_image, downscale_to_max_edge, dhash, jpeg_orientation
+
+
+# Small striped test image so both encoders produce real payloads
+_BGR = np.zeros((32, 48, 3), dtype=np.uint8)
+_BGR[:, ::4] = (255, 128, 0)
+
+
+def _rotated_jpeg(orientation: int) -> bytes:
+    """200x100 JPEG carrying the given EXIF Orientation"""
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = BytesIO()
+    Image.new('RGB', (200, 100), color='red').save(buffer, format='JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class TestDecodeImage:
+    """Tests for decode_image"""
+
+    def test_decode_jpeg(self):
+        """Test JPEG bytes decode to a BGR array of the right shape"""
+        _, buffer = cv2.imencode('.jpg', _BGR)
+
+        image = decode_image(buffer.tobytes())
+
+        assert image is not None
+        assert image.shape == _BGR.shape
+
+    def test_decode_png(self):
+        """Test non-JPEG bytes go through OpenCV losslessly"""
+        _, buffer = cv2.imencode('.png', _BGR)
+
+        image = decode_image(buffer.tobytes())
+
+        assert np.array_equal(image, _BGR)
+
+    def test_exif_orientation_applied(self, monkeypatch):
+        """Test EXIF-rotated JPEGs skip TurboJPEG (which ignores orientation)"""
+        class _UnusedDecoder:
+            def decode(self, *args, **kwargs):
+                raise AssertionError("TurboJPEG used for a rotated JPEG")
+
+        monkeypatch.setattr(utils.image, "TURBOJPEG_AVAILABLE", True)
+        monkeypatch.setattr(utils.image, "_jpeg", _UnusedDecoder())
+        monkeypatch.setattr(utils.image, "TJPF_BGR", 0, raising=False)
+
+        data = _rotated_jpeg(6)
+
+        assert jpeg_orientation(data) == 6
+        assert decode_image(data).shape == (200, 100, 3)
+
+    def test_jpeg_orientation_defaults_to_upright(self):
+        """Test JPEGs without an orientation tag read as upright"""
+        _, buffer = cv2.imencode('.jpg', _BGR)
+
+        assert jpeg_orientation(buffer.tobytes()) == 1
+        assert jpeg_orientation(b"\xff\xd8not really a jpeg") == 1
+
+    def test_decode_invalid_bytes(self):
+        """Test garbage input returns None"""
+        assert decode_image(b"\xff\xd8not really a jpeg") is None
+
+
+class TestDownscale:
+    """Tests for downscale_to_max_edge"""
+
+    def test_downscale_large_image(self):
+        """Test longest edge is capped and aspect ratio kept"""
+        image = np.zeros((1500, 3000, 3), dtype=np.uint8)
+
+        small = downscale_to_max_edge(image, 1024)
+
+        assert small.shape == (512, 1024, 3)
+
+    def test_small_image_untouched(self):
+        """Test images under the cap are returned as-is"""
+        assert downscale_to_max_edge(_BGR, 1024) is _BGR
+
+
+class TestDHash:
+    """Tests for dhash"""
+
+    def test_dhash_stable_under_recompression(self):
+        """Test a JPEG round-trip stays within a few bits"""
+        _, buffer = cv2.imencode('.jpg', _BGR, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        recompressed = decode_image(buffer.tobytes())
+
+        assert (dhash(_BGR) ^ dhash(recompressed)).bit_count() < 5
+
+    def test_dhash_differs_for_different_scenes(self):
+        """Test mirrored gradients produce distant hashes"""
+        ramp = np.tile(np.arange(0, 256, 4, dtype=np.uint8), (64, 1))
+
+        assert (dhash(ramp) ^ dhash(ramp[:, ::-1])).bit_count() > 32
+
+
+class TestReadUpload:
+    """Tests for the /detect upload size cap"""
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_rejected(self, client, mock_gemini):
+        """Test uploads over the limit get 413 before any decoding"""
+        files = {"file": ("huge.jpg", b"\xff\xd8" + b"\0" * (MAX_UPLOAD_BYTES + 1), "image/jpeg")}
+        response = await client.post("/detect", files=files)
+
+        assert response.status_code == 413
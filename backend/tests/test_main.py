@@ -2,62 +2,40 @@
 Unit tests for main application and core API endpoints
 Tests for health check, CORS, rate limiting, and general app behavior
 """
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import AsyncMock
+from types import SimpleNamespace
+
+# What /detect makes of the canned Gemini reply (conftest.GEMINI_RESPONSE)
+EXPECTED_DETECTION = {"label": "Car", "confidence": 0.9}
 
 
 class TestHealthAndStatus:
     """Tests for health check and status endpoints"""
     
     @pytest.mark.asyncio
-    async def test_root_endpoint(self, client):
-        """Test root endpoint returns welcome message"""
-        response = await client.get("/")
+    async def test_basic_endpoints(self, client):
+        """Test root, Swagger docs and OpenAPI schema are all accessible"""
+        root, docs, openapi = await asyncio.gather(
+            client.get("/"),
+            client.get("/docs"),
+            client.get("/openapi.json")
+        )
         
-        # Should return 200 with info
-        assert response.status_code == 200
-        data = response.json()
+        # Root should return 200 with info
+        assert root.status_code == 200
+        data = root.json()
         assert "message" in data or "name" in data or "version" in data
-    
-    @pytest.mark.asyncio
-    async def test_docs_accessible(self, client):
-        """Test Swagger docs are accessible"""
-        response = await client.get("/docs")
         
-        # Should return 200 (HTML for Swagger UI)
-        assert response.status_code == 200
-    
-    @pytest.mark.asyncio
-    async def test_openapi_json_accessible(self, client):
-        """Test OpenAPI JSON schema is accessible"""
-        response = await client.get("/openapi.json")
+        # Docs should return 200 (HTML for Swagger UI)
+        assert docs.status_code == 200
         
-        # Should return 200 with OpenAPI spec
-        assert response.status_code == 200
-        data = response.json()
-        assert "openapi" in data
-        assert "paths" in data
-
-
-class TestCORS:
-    """Tests for CORS configuration"""
-    
-    @pytest.mark.asyncio
-    async def test_cors_headers_present(self, client):
-        """Test CORS headers are included in responses"""
-        response = await client.options("/api/auth/login")
-        
-        # OPTIONS might return 200 or 405 depending on route config
-        assert response.status_code in [200, 405]
-    
-    @pytest.mark.asyncio
-    async def test_cors_allows_localhost(self, client):
-        """Test CORS allows localhost origin"""
-        headers = {"Origin": "http://localhost:3000"}
-        response = await client.options("/api/auth/login", headers=headers)
-        
-        # Should allow the origin (200) or 405 for no OPTIONS handler
-        assert response.status_code in [200, 405]
+        # OpenAPI should return 200 with spec
+        assert openapi.status_code == 200
+        spec = openapi.json()
+        assert "openapi" in spec
+        assert "paths" in spec
 
 
 class TestErrorHandling:
@@ -91,32 +69,27 @@ class TestErrorHandling:
         assert response.status_code == 422
 
 
-class TestAPIRouters:
-    """Tests for API router registration"""
-    
-    @pytest.mark.asyncio
-    async def test_auth_router_registered(self, client):
-        """Test auth router is properly registered"""
-        response = await client.get("/api/auth/me")
-        
-        # Should return 401/403 (not 404) if router is registered
-        assert response.status_code in [401, 403]
-    
-    @pytest.mark.asyncio
-    async def test_detection_router_registered(self, client):
-        """Test detection router is properly registered"""
-        response = await client.get("/api/detections/stats")
-        
-        # Should return 401/403 (not 404) if router is registered
-        assert response.status_code in [401, 403]
+class TestSmokeMatrix:
+    """Status-code smoke probes for CORS, router registration and OAuth callbacks"""
     
     @pytest.mark.asyncio
-    async def test_ocr_router_registered(self, client):
-        """Test OCR router is properly registered"""
-        response = await client.get("/api/ocr/status")
+    @pytest.mark.parametrize("method,path,allowed", [
+        # OPTIONS might return 200 or 405 depending on route config
+        ("OPTIONS", "/api/auth/login", {200, 405}),
+        # Routers are registered if protected routes return 401/403 (not 404)
+        ("GET", "/api/auth/me", {401, 403}),
+        ("GET", "/api/detections/stats", {401, 403}),
+        # OCR status is public
+        ("GET", "/api/ocr/status", {200}),
+        # OAuth callback must reject a missing or mismatched state (authlib OAuthError)
+        ("GET", "/api/auth/google/callback", {400}),
+        ("GET", "/api/auth/google/callback?code=invalid&state=wrong", {400}),
+    ])
+    async def test_status_codes(self, client, method, path, allowed):
+        """Test each probe returns one of its accepted status codes"""
+        response = await client.request(method, path)
         
-        # Should return 200 (OCR status is public)
-        assert response.status_code == 200
+        assert response.status_code in allowed
 
 
 class TestRateLimiting:
@@ -137,10 +110,8 @@ class TestMiddleware:
     """Tests for middleware configuration"""
     
     @pytest.mark.asyncio
-    async def test_session_middleware_active(self, client):
+    async def test_session_middleware_active(self, client, app):
         """Test session middleware is active (needed for OAuth)"""
-        from main import app
-        
         # Check middleware is registered
         middleware_types = [type(m).__name__ for m in app.user_middleware]
         
@@ -152,24 +123,20 @@ class TestDetectionEndpoint:
     """Additional tests for main /detect endpoint"""
     
     @pytest.mark.asyncio
-    async def test_detect_returns_json(self, client):
+    async def test_detect_returns_json(self, post_detect, png_multipart, decoded_png):
         """Test /detect always returns JSON"""
-        from io import BytesIO
-        from PIL import Image
-        
-        img = Image.new('RGB', (100, 100), color='blue')
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        
-        files = {"file": ("test.png", buffer.getvalue(), "image/png")}
-        response = await client.post("/detect", files=files)
+        _, data = await post_detect(png_multipart)
         
         # Response should always be JSON
-        assert response.headers.get("content-type", "").startswith("application/json")
+        assert data is not None
     
     @pytest.mark.asyncio
-    async def test_detect_large_image(self, client):
-        """Test detection handles larger images"""
+    @pytest.mark.parametrize("gemini_error,expected_count", [
+        (None, 1),
+        (RuntimeError("quota exceeded"), 0),
+    ], ids=["gemini_ok", "gemini_error"])
+    async def test_detect_large_image(self, post_detect, encode_upload, mock_gemini, monkeypatch, gemini_error, expected_count):
+        """Test detection handles larger images, with or without a Gemini reply"""
         from io import BytesIO
         from PIL import Image
         
@@ -178,11 +145,185 @@ class TestDetectionEndpoint:
         buffer = BytesIO()
         img.save(buffer, format='JPEG', quality=50)
         
-        files = {"file": ("large.jpg", buffer.getvalue(), "image/jpeg")}
-        response = await client.post("/detect", files=files)
+        # A Gemini failure degrades to an empty result rather than an error
+        monkeypatch.setattr(mock_gemini.return_value.generate_content_async, "side_effect", gemini_error)
+        
+        status, data = await post_detect(encode_upload("large.jpg", buffer.getvalue(), "image/jpeg"))
+        
+        # Upload handling only - model inference is mocked
+        assert status == 200
+        assert data["object_count"] == expected_count
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("first_reply", [
+        RuntimeError("service unavailable"),
+        SimpleNamespace(text="Sorry, I can't help with that."),
+    ], ids=["gemini_error", "unparseable_reply"])
+    async def test_detect_failed_reply_not_cached(self, post_detect, png_multipart, mock_gemini, monkeypatch, first_reply):
+        """Test a failed Gemini call isn't cached: re-sending the upload asks again"""
+        generate = mock_gemini.return_value.generate_content_async
+        monkeypatch.setattr(generate, "side_effect", [first_reply, generate.return_value])
+        
+        _, failed = await post_detect(png_multipart)
+        status, data = await post_detect(png_multipart)
+        
+        assert failed["object_count"] == 0
+        assert status == 200
+        assert data["object_count"] == 1
+        assert generate.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_detect_reuses_identical_upload(self, client, mock_gemini, encode_upload, monkeypatch):
+        """Test re-uploading the same bytes is served from the content cache"""
+        import cv2
+        import numpy as np
+        import main
+        
+        # Cache hits shouldn't pay for the near-duplicate signature
+        signature_calls = []
+        real_signature = main.frame_signature
+        monkeypatch.setattr(main, "frame_signature", lambda image: signature_calls.append(1) or real_signature(image))
+        
+        image = np.zeros((120, 160, 3), dtype=np.uint8)
+        cv2.rectangle(image, (20, 30), (90, 100), (255, 255, 255), -1)
+        _, buffer = cv2.imencode('.png', image)
+        
+        body, headers = encode_upload("scene.png", buffer.tobytes(), "image/png")
+        first = await client.post("/detect", content=body, headers=headers)
+        second = await client.post("/detect", content=body, headers=headers)
         
-        # Should handle large images (may return 200 or timeout error)
-        assert response.status_code in [200, 400, 500, 504]
+        assert first.json()["detections"] == second.json()["detections"]
+        assert mock_gemini.return_value.generate_content_async.await_count == 1
+        assert len(signature_calls) == 1
+    
+    @pytest.mark.asyncio
+    async def test_detect_reuses_near_duplicate(self, post_detect, mock_gemini, encode_upload):
+        """Test a slightly different re-send of the previous frame skips Gemini"""
+        import cv2
+        import numpy as np
+        
+        image = np.zeros((120, 160, 3), dtype=np.uint8)
+        cv2.rectangle(image, (20, 30), (90, 100), (255, 255, 255), -1)
+        noisy = image.copy()
+        noisy[5:8, 140:143] = 3
+        
+        for frame in (image, noisy):
+            _, buffer = cv2.imencode('.png', frame)
+            status, _ = await post_detect(encode_upload("scene.png", buffer.tobytes(), "image/png"))
+            assert status == 200
+        
+        assert mock_gemini.return_value.generate_content_async.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_detect_same_size_different_images(self, post_detect, mock_gemini, encode_upload):
+        """Test flat images with equal dHashes still get their own Gemini call"""
+        import cv2
+        import numpy as np
+        
+        for colour in ((0, 0, 255), (255, 0, 0)):
+            _, buffer = cv2.imencode('.png', np.full((100, 100, 3), colour, dtype=np.uint8))
+            status, _ = await post_detect(encode_upload("flat.png", buffer.tobytes(), "image/png"))
+            assert status == 200
+        
+        assert mock_gemini.return_value.generate_content_async.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_detect_binary_jpeg_response(self, client, mock_gemini):
+        """Test Accept: image/jpeg returns raw JPEG bytes plus a detections header"""
+        import json
+        import cv2
+        import numpy as np
+        
+        _, buffer = cv2.imencode('.png', np.zeros((80, 80, 3), dtype=np.uint8))
+        
+        files = {"file": ("frame.png", buffer.tobytes(), "image/png")}
+        response = await client.post("/detect", files=files, headers={"Accept": "image/jpeg"})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.content[:2] == b"\xff\xd8"
+        detection = json.loads(response.headers["x-detections"])[0]
+        assert {k: detection[k] for k in EXPECTED_DETECTION} == EXPECTED_DETECTION
+        assert "box" in detection
+    
+    @pytest.mark.asyncio
+    async def test_detect_boxes_only(self, mock_gemini):
+        """Test include_image=false skips the annotated image (handler called directly)"""
+        import cv2
+        import numpy as np
+        from io import BytesIO
+        from starlette.datastructures import UploadFile
+        from starlette.requests import Request
+        from main import detect_objects
+        
+        _, buffer = cv2.imencode('.png', np.full((60, 90, 3), 128, dtype=np.uint8))
+        upload = UploadFile(BytesIO(buffer.tobytes()), filename="frame.png")
+        
+        # No routing, middleware or rate limiting; the HTTP path is covered above
+        data = await detect_objects.__wrapped__(
+            Request({"type": "http", "headers": []}), upload, include_image=False
+        )
+        
+        assert data["image"] is None
+        assert data["detections"] == [{**EXPECTED_DETECTION, "box": [9, 12, 54, 48]}]
+
+
+class TestGeminiClient:
+    """Tests for the keepalive-tuned Gemini client hand-off"""
+    
+    @pytest.mark.asyncio
+    async def test_model_gets_tuned_async_client(self, monkeypatch):
+        """Test get_gemini_model installs our async client on the model"""
+        import main
+        import google.ai.generativelanguage as glm
+        
+        monkeypatch.setattr(main, "_gemini_model", None)
+        monkeypatch.setattr(main.settings, "gemini_api_key", "test-key")
+        
+        model = main.get_gemini_model()
+        
+        assert isinstance(model._async_client, glm.GenerativeServiceAsyncClient)
+    
+    @pytest.mark.asyncio
+    async def test_sdk_honours_model_async_client(self):
+        """Test generate_content_async sends through model._async_client (private SDK contract)"""
+        import google.generativeai as genai
+        from google.generativeai import protos
+        
+        model = genai.GenerativeModel("gemini-test")
+        model._async_client = AsyncMock()
+        model._async_client.generate_content.return_value = protos.GenerateContentResponse(
+            candidates=[{"content": {"parts": [{"text": "[]"}]}}]
+        )
+        
+        response = await model.generate_content_async(["detect"])
+        
+        assert response.text == "[]"
+        model._async_client.generate_content.assert_awaited_once()
+
+
+class TestBoxConversion:
+    """Tests for Gemini percentage bbox conversion"""
+    
+    def test_percent_boxes_to_pixels(self):
+        """Test scaling, clamping and fallback for malformed boxes"""
+        from main import percent_boxes_to_pixels
+        
+        objects = [
+            {"bbox": [10, 20, 50, 80]},
+            {"bbox": [-5, 0, 200, 100]},
+            {"bbox": [1, 2]},
+            {"bbox": ["x", 0, 1, 1]},
+        ]
+        
+        boxes = percent_boxes_to_pixels(objects, 200, 100).tolist()
+        
+        assert boxes == [
+            [20, 20, 100, 80],
+            [0, 0, 200, 100],
+            [50, 25, 150, 75],
+            [50, 25, 150, 75],
+        ]
 
 
 class TestEnvironmentConfig:
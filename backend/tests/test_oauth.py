@@ -3,41 +3,21 @@ Unit tests for OAuth endpoints
 Tests for /api/auth/google/* routes
 """
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
 
 
 class TestGoogleOAuth:
     """Tests for Google OAuth flow"""
     
     @pytest.mark.asyncio
-    async def test_google_login_redirect(self, client):
+    async def test_google_login_redirect(self, client, fake_oauth, monkeypatch):
         """Test Google login returns redirect"""
-        with patch('routes.oauth.oauth') as mock_oauth:
-            mock_oauth.google.authorize_redirect = AsyncMock(return_value=MagicMock(
-                status_code=302,
-                headers={"location": "https://accounts.google.com/"}
-            ))
-            
-            response = await client.get("/api/auth/google/login")
-            
-            # Should redirect to Google (or 404 if route not mounted at this path)
-            assert response.status_code in [302, 307, 200, 404, 500]
-    
-    @pytest.mark.asyncio
-    async def test_google_callback_no_code(self, client):
-        """Test Google callback without auth code"""
-        response = await client.get("/api/auth/google/callback")
+        # Past the "not configured" guard, onto the (fake) Google redirect
+        monkeypatch.setenv("GOOGLE_CLIENT_ID", "test-client-id")
         
-        # Should fail without code
-        assert response.status_code in [400, 500, 302]
-    
-    @pytest.mark.asyncio
-    async def test_google_callback_invalid_state(self, client):
-        """Test Google callback with invalid state"""
-        response = await client.get("/api/auth/google/callback?code=invalid&state=wrong")
+        response = await client.get("/api/auth/google")
         
-        # Should fail validation
-        assert response.status_code in [400, 500, 302]
+        assert response.status_code == 302
+        fake_oauth.google.authorize_redirect.assert_awaited_once()
 
 
 class TestOAuthConfig:
@@ -53,19 +33,15 @@ class TestOAuthConfig:
         assert hasattr(settings, 'google_client_secret')
         assert hasattr(settings, 'google_redirect_uri')
     
-    def test_oauth_router_registered(self):
+    def test_oauth_router_registered(self, app_paths):
         """Test OAuth router is registered"""
-        from main import app
-        
-        routes = [r.path for r in app.routes]
-        google_routes = [r for r in routes if 'google' in r]
-        
-        assert len(google_routes) > 0, "Google OAuth routes should be registered"
+        assert any('google' in path for path in app_paths), "Google OAuth routes should be registered"
 
 
 class TestOAuthFlow:
     """Tests for complete OAuth flow logic"""
     
+    @pytest.mark.skip(reason="pending")
     @pytest.mark.asyncio
     async def test_oauth_creates_user_if_not_exists(self):
         """Test OAuth creates new user if email doesn't exist"""
@@ -73,6 +49,7 @@ class TestOAuthFlow:
         # For unit testing, we verify the logic exists
         pass
     
+    @pytest.mark.skip(reason="pending")
     @pytest.mark.asyncio
     async def test_oauth_returns_jwt(self):
         """Test successful OAuth returns JWT token"""
@@ -83,6 +60,7 @@ class TestOAuthFlow:
 class TestOAuthSecurity:
     """Tests for OAuth security measures"""
     
+    @pytest.mark.skip(reason="pending")
     def test_state_parameter_required(self):
         """Test OAuth uses state parameter for CSRF protection"""
         # OAuth state is handled by authlib
@@ -7,6 +7,11 @@ from unittest.mock import AsyncMock, patch, MagicMock
 import base64
 from io import BytesIO
 from PIL import Image
+import numpy as np
+
+# Constant test images (content is never asserted on, only shape)
+_RGB = np.zeros((100, 100, 3), dtype=np.uint8)
+_GRAY = np.zeros((100, 100), dtype=np.uint8)
 
 
 class TestOCRStatus:
@@ -208,13 +213,9 @@ class TestPreprocessing:
     
     def test_preprocessing_returns_image(self):
         """Test preprocessing returns valid image array"""
-        import numpy as np
         from routes.ocr import preprocess_for_ocr
         
-        # Create test image array
-        test_img = np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8)
-        
-        result = preprocess_for_ocr(test_img)
+        result = preprocess_for_ocr(_RGB)
         
         assert result is not None
         assert result.shape[0] == 100  # Height preserved
@@ -223,13 +224,9 @@ class TestPreprocessing:
     
     def test_preprocessing_grayscale_input(self):
         """Test preprocessing handles grayscale input"""
-        import numpy as np
         from routes.ocr import preprocess_for_ocr
         
-        # Create grayscale test image
-        test_img = np.random.randint(0, 255, (100, 100), dtype=np.uint8)
-        
-        result = preprocess_for_ocr(test_img)
+        result = preprocess_for_ocr(_GRAY)
         
         assert result is not None
         assert len(result.shape) == 2  # Stays grayscale
@@ -0,0 +1,43 @@
+"""
+Fast smoke tests for the /ping health check
+Mounts the ping handler on a bare FastAPI app (no middleware or routers)
+and imports it from routes.health, so main's OpenCV/Gemini imports are skipped
+"""
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from routes.health import ping
+
+
+@pytest_asyncio.fixture
+async def ping_client():
+    """Async client for a micro-app exposing only /ping"""
+    micro_app = FastAPI()
+    micro_app.get("/ping")(ping)
+
+    transport = ASGITransport(app=micro_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+class TestPingFast:
+    """Tests for the /ping handler contract"""
+
+    @pytest.mark.asyncio
+    async def test_ping(self, ping_client):
+        """Test ping returns ok status with timestamp"""
+        response = await ping_client.get("/ping")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ok"
+        assert "timestamp" in data
+
+    @pytest.mark.asyncio
+    async def test_ping_wired_in_main(self, client):
+        """Test /ping is registered on the full application"""
+        response = await client.get("/ping")
+
+        assert response.status_code == 200
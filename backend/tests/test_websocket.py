@@ -18,12 +18,12 @@ class TestConnectionManager:
         
         assert hasattr(manager, 'active_connections')
         assert hasattr(manager, 'user_connections')
-        assert isinstance(manager.active_connections, list)
+        assert isinstance(manager.active_connections, set)
         assert isinstance(manager.user_connections, dict)
     
     @pytest.mark.asyncio
-    async def test_connect_adds_to_list(self):
-        """Test connect adds websocket to active list"""
+    async def test_connect_adds_to_set(self):
+        """Test connect adds websocket to active set"""
         from routes.websocket import ConnectionManager
         
         manager = ConnectionManager()
@@ -49,13 +49,13 @@ class TestConnectionManager:
         assert user_id in manager.user_connections
         assert mock_ws in manager.user_connections[user_id]
     
-    def test_disconnect_removes_from_list(self):
-        """Test disconnect removes websocket from list"""
+    def test_disconnect_removes_from_set(self):
+        """Test disconnect removes websocket from set"""
         from routes.websocket import ConnectionManager
         
         manager = ConnectionManager()
         mock_ws = MagicMock()
-        manager.active_connections.append(mock_ws)
+        manager.active_connections.add(mock_ws)
         
         manager.disconnect(mock_ws)
         
@@ -68,8 +68,8 @@ class TestConnectionManager:
         manager = ConnectionManager()
         mock_ws = MagicMock()
         user_id = "user_123"
-        manager.active_connections.append(mock_ws)
-        manager.user_connections[user_id] = [mock_ws]
+        manager.active_connections.add(mock_ws)
+        manager.user_connections[user_id] = {mock_ws}
         
         manager.disconnect(mock_ws, user_id)
         
@@ -84,13 +84,15 @@ class TestConnectionManager:
         manager = ConnectionManager()
         mock_ws1 = AsyncMock()
         mock_ws2 = AsyncMock()
-        manager.active_connections = [mock_ws1, mock_ws2]
+        manager.active_connections = {mock_ws1, mock_ws2}
         
         message = {"type": "test", "data": "hello"}
         await manager.broadcast(message)
         
-        mock_ws1.send_json.assert_awaited_with(message)
-        mock_ws2.send_json.assert_awaited_with(message)
+        # Payload is encoded once and sent as the same text frame
+        payload = mock_ws1.send_text.await_args[0][0]
+        assert json.loads(payload) == message
+        mock_ws2.send_text.assert_awaited_with(payload)
     
     @pytest.mark.asyncio
     async def test_broadcast_removes_dead_connections(self):
@@ -100,9 +102,9 @@ class TestConnectionManager:
         manager = ConnectionManager()
         mock_ws_alive = AsyncMock()
         mock_ws_dead = AsyncMock()
-        mock_ws_dead.send_json.side_effect = Exception("Connection closed")
+        mock_ws_dead.send_text.side_effect = Exception("Connection closed")
         
-        manager.active_connections = [mock_ws_alive, mock_ws_dead]
+        manager.active_connections = {mock_ws_alive, mock_ws_dead}
         
         await manager.broadcast({"type": "test"})
         
@@ -117,12 +119,13 @@ class TestConnectionManager:
         manager = ConnectionManager()
         mock_ws = AsyncMock()
         user_id = "user_123"
-        manager.user_connections[user_id] = [mock_ws]
+        manager.user_connections[user_id] = {mock_ws}
         
         message = {"type": "private", "data": "hello"}
         await manager.send_to_user(user_id, message)
         
-        mock_ws.send_json.assert_awaited_with(message)
+        mock_ws.send_text.assert_awaited_once()
+        assert json.loads(mock_ws.send_text.await_args[0][0]) == message
 
 
 class TestHelperFunctions:
@@ -172,28 +175,16 @@ class TestHelperFunctions:
 class TestWebSocketRoutes:
     """Tests for WebSocket route functionality"""
     
-    @pytest.mark.asyncio
-    async def test_websocket_detections_endpoint_exists(self, client):
+    def test_websocket_detections_endpoint_exists(self, app_paths):
         """Test /ws/detections endpoint is registered"""
         # WebSocket endpoints can't be tested with regular HTTP client
         # but we can verify the app has the route
-        from main import app
-        
-        routes = [r.path for r in app.routes]
-        ws_routes = [r for r in routes if 'ws' in r]
-        
-        assert len(ws_routes) > 0, "Should have WebSocket routes"
+        assert any('ws' in path for path in app_paths), "Should have WebSocket routes"
     
-    @pytest.mark.asyncio
-    async def test_websocket_live_endpoint_exists(self, client):
+    def test_websocket_live_endpoint_exists(self, app_paths):
         """Test /ws/live/{session_id} endpoint is registered"""
-        from main import app
-        
-        routes = [r.path for r in app.routes]
-        live_routes = [r for r in routes if 'live' in r]
-        
         # Should have at least one live-related route
-        # This could be the WebSocket route
+        assert any('live' in path for path in app_paths)
 
 
 class TestWebSocketMessages:
@@ -201,12 +192,12 @@ class TestWebSocketMessages:
     
     def test_connected_message_format(self):
         """Test connected message has correct format"""
-        from datetime import datetime
+        from routes.websocket import now_iso
         
         message = {
             "type": "connected",
             "message": "Connected to detection stream",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now_iso()
         }
         
         assert message["type"] == "connected"
@@ -214,12 +205,12 @@ class TestWebSocketMessages:
     
     def test_detection_message_format(self):
         """Test detection message has correct format"""
-        from datetime import datetime
+        from routes.websocket import now_iso
         
         message = {
             "type": "detection",
             "data": {"objects": 3, "classes": ["car", "person", "dog"]},
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now_iso()
         }
         
         assert message["type"] == "detection"
@@ -228,24 +219,42 @@ class TestWebSocketMessages:
     
     def test_stats_message_format(self):
         """Test stats message has correct format"""
-        from datetime import datetime
+        from routes.websocket import now_iso
         
         message = {
             "type": "stats",
             "data": {"total": 150, "avg_confidence": 0.85},
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now_iso()
         }
         
         assert message["type"] == "stats"
         assert isinstance(message["data"]["total"], int)
     
+    def test_now_iso_reused_within_second(self, monkeypatch):
+        """Test timestamp string is cached per wall-clock second"""
+        from types import SimpleNamespace
+        from routes import websocket
+        
+        # Frozen clock: two calls inside one second, then the next second
+        clock = iter([1700000000.25, 1700000000.75, 1700000001.1])
+        monkeypatch.setattr(websocket, "time", SimpleNamespace(time=lambda: next(clock)))
+        monkeypatch.setattr(websocket, "_ts_cache", [0, ""])
+        
+        first = websocket.now_iso()
+        second = websocket.now_iso()
+        third = websocket.now_iso()
+        
+        assert first is second
+        assert first == "2023-11-14T22:13:20"
+        assert third == "2023-11-14T22:13:21"
+    
     def test_pong_response_format(self):
         """Test pong response has correct format"""
-        from datetime import datetime
+        from routes.websocket import now_iso
         
         message = {
             "type": "pong",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now_iso()
         }
         
         assert message["type"] == "pong"
@@ -5,16 +5,75 @@ Provides caching for repeated detections and session management
 import hashlib
 import json
 import os
+import time
+from collections import OrderedDict
 from typing import Optional, Any
 from datetime import timedelta
 
 # Check if redis is available
 try:
     import redis
+    import redis.asyncio as aioredis
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
 
+# Check if blake3 is available (SIMD-accelerated hashing)
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+# Check if orjson is available (faster Redis payload encoding)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Redis connection pool settings
+REDIS_MAX_CONNECTIONS = 64
+REDIS_HEALTH_CHECK_INTERVAL = 30
+
+# In-memory fallback: max entries per namespace before LRU eviction
+MEMORY_DETECTION_MAX_ENTRIES = 100
+MEMORY_SESSION_MAX_ENTRIES = 1000
+MEMORY_RATE_LIMIT_MAX_ENTRIES = 10000
+MEMORY_STATS_MAX_ENTRIES = 1000
+# Fraction of a namespace evicted at once when it overflows
+MEMORY_EVICTION_RATIO = 0.1
+
+# Seconds to reuse the Redis key count between stats polls
+STATS_DBSIZE_TTL_SECONDS = 5
+
+# Images above this size are hashed with multiple threads
+BLAKE3_THREADED_MIN_BYTES = 1024 * 1024
+
+
+# INCR + EXPIRE on first hit, in a single round-trip
+RATE_LIMIT_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return current
+"""
+
+
+def _dumps(value: Any) -> bytes:
+    """Serialize a cache value for Redis"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC)
+    return json.dumps(value).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    """Deserialize a cache value read from Redis"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
 class CacheManager:
     """
@@ -23,29 +82,90 @@ class CacheManager:
     """
     
     def __init__(self):
-        self.redis_client: Optional[redis.Redis] = None
-        self.memory_cache: dict = {}
+        self.redis_client: Optional["aioredis.Redis"] = None
+        self._redis_ready = False
+        self._rate_limit_sha: Optional[str] = None
+        # In-memory fallback, one LRU per namespace so image traffic
+        # never evicts sessions or rate-limit counters
+        self._det_cache: OrderedDict = OrderedDict()
+        self._sess_cache: OrderedDict = OrderedDict()
+        self._rl_cache: OrderedDict = OrderedDict()
+        # Stats entries are (expires_at, data) since they are short-lived
+        self._stats_cache: OrderedDict = OrderedDict()
+        # (monotonic timestamp, value) of the last DBSIZE call
+        self._dbsize_cached: Optional[tuple] = None
         self._connect()
     
     def _connect(self):
-        """Connect to Redis if available"""
+        """Create the async Redis connection pool if available"""
         if not REDIS_AVAILABLE:
             print("⚠️ Redis not installed, using in-memory cache")
             return
         
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         
+        # No I/O happens here; the pool connects on first use
+        self.redis_client = aioredis.from_url(
+            redis_url,
+            decode_responses=False,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL
+        )
+    
+    async def _get_client(self) -> Optional["aioredis.Redis"]:
+        """
+        Get the Redis client, verifying the connection on first use
+        
+        Returns:
+            Redis client or None to use the in-memory cache
+        """
+        if self.redis_client is None or self._redis_ready:
+            return self.redis_client
+        
         try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.redis_client.ping()
+            await self.redis_client.ping()
+            self._rate_limit_sha = await self.redis_client.script_load(RATE_LIMIT_SCRIPT)
+            self._redis_ready = True
             print("✅ Connected to Redis cache")
         except Exception as e:
             print(f"⚠️ Redis connection failed: {e}, using in-memory cache")
             self.redis_client = None
+        
+        return self.redis_client
+    
+    @staticmethod
+    def _lru_get(cache: OrderedDict, key: str) -> Any:
+        """Read from an in-memory LRU, marking the key as recently used"""
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+    
+    @staticmethod
+    def _lru_set(cache: OrderedDict, key: str, value: Any, max_entries: int):
+        """Write to an in-memory LRU, evicting the least recently used keys"""
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > max_entries:
+            # Evict a batch so overflow is handled once per N writes
+            for _ in range(max(1, int(max_entries * MEMORY_EVICTION_RATIO))):
+                cache.popitem(last=False)
     
     def _hash_image(self, image_bytes: bytes) -> str:
-        """Create hash of image for cache key"""
-        return hashlib.md5(image_bytes).hexdigest()
+        """
+        Create hash of image for cache key
+        
+        Digests every byte (BLAKE3, SHA-256 fallback): the key decides
+        which detections an upload is served, so it must be collision-safe.
+        """
+        if not BLAKE3_AVAILABLE:
+            return hashlib.sha256(image_bytes).hexdigest()
+        
+        if len(image_bytes) >= BLAKE3_THREADED_MIN_BYTES:
+            hasher = blake3(image_bytes, max_threads=blake3.AUTO)
+        else:
+            hasher = blake3(image_bytes)
+        return hasher.hexdigest()
     
     async def get_cached_detection(self, image_bytes: bytes) -> Optional[dict]:
         """
@@ -58,18 +178,18 @@ class CacheManager:
             Cached detection result or None
         """
         cache_key = f"detection:{self._hash_image(image_bytes)}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                cached = self.redis_client.get(cache_key)
+                cached = await client.get(cache_key)
                 if cached:
-                    return json.loads(cached)
+                    return _loads(cached)
             except Exception:
                 pass
         else:
             # Fallback to memory cache
-            if cache_key in self.memory_cache:
-                return self.memory_cache[cache_key]
+            return self._lru_get(self._det_cache, cache_key)
         
         return None
     
@@ -88,37 +208,35 @@ class CacheManager:
             expire_seconds: Cache expiration time (default 1 hour)
         """
         cache_key = f"detection:{self._hash_image(image_bytes)}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                self.redis_client.setex(
+                await client.setex(
                     cache_key, 
                     expire_seconds, 
-                    json.dumps(result)
+                    _dumps(result)
                 )
             except Exception:
                 pass
         else:
             # Fallback to memory cache (with size limit)
-            if len(self.memory_cache) > 100:
-                # Clear oldest entries
-                self.memory_cache.clear()
-            self.memory_cache[cache_key] = result
+            self._lru_set(self._det_cache, cache_key, result, MEMORY_DETECTION_MAX_ENTRIES)
     
     async def get_session(self, session_id: str) -> Optional[dict]:
         """Get cached session data"""
         cache_key = f"session:{session_id}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                cached = self.redis_client.get(cache_key)
+                cached = await client.get(cache_key)
                 if cached:
-                    return json.loads(cached)
+                    return _loads(cached)
             except Exception:
                 pass
         else:
-            if cache_key in self.memory_cache:
-                return self.memory_cache[cache_key]
+            return self._lru_get(self._sess_cache, cache_key)
         
         return None
     
@@ -130,30 +248,87 @@ class CacheManager:
     ):
         """Cache session data (default 24 hours)"""
         cache_key = f"session:{session_id}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                self.redis_client.setex(
+                await client.setex(
                     cache_key, 
                     expire_seconds, 
-                    json.dumps(data)
+                    _dumps(data)
                 )
             except Exception:
                 pass
         else:
-            self.memory_cache[cache_key] = data
+            self._lru_set(self._sess_cache, cache_key, data, MEMORY_SESSION_MAX_ENTRIES)
     
     async def invalidate_session(self, session_id: str):
         """Remove session from cache"""
         cache_key = f"session:{session_id}"
+        client = await self._get_client()
+        
+        if client:
+            try:
+                await client.delete(cache_key)
+            except Exception:
+                pass
+        else:
+            self._sess_cache.pop(cache_key, None)
+    
+    async def get_user_stats(self, user_id: str) -> Optional[dict]:
+        """Get cached detection stats for a user"""
+        cache_key = f"stats:v1:{user_id}"
+        client = await self._get_client()
+        
+        if client:
+            try:
+                cached = await client.get(cache_key)
+                if cached:
+                    return _loads(cached)
+            except Exception:
+                pass
+        else:
+            entry = self._lru_get(self._stats_cache, cache_key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+        
+        return None
+    
+    async def set_user_stats(
+        self, 
+        user_id: str, 
+        stats: dict, 
+        expire_seconds: int = 5
+    ):
+        """Cache detection stats for a user (default 5 seconds)"""
+        cache_key = f"stats:v1:{user_id}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                self.redis_client.delete(cache_key)
+                await client.setex(
+                    cache_key, 
+                    expire_seconds, 
+                    _dumps(stats)
+                )
             except Exception:
                 pass
         else:
-            self.memory_cache.pop(cache_key, None)
+            entry = (time.monotonic() + expire_seconds, stats)
+            self._lru_set(self._stats_cache, cache_key, entry, MEMORY_STATS_MAX_ENTRIES)
+    
+    async def invalidate_user_stats(self, user_id: str):
+        """Drop cached stats after the user's history changes"""
+        cache_key = f"stats:v1:{user_id}"
+        client = await self._get_client()
+        
+        if client:
+            try:
+                await client.delete(cache_key)
+            except Exception:
+                pass
+        else:
+            self._stats_cache.pop(cache_key, None)
     
     async def increment_rate_limit(
         self, 
@@ -168,31 +343,50 @@ class CacheManager:
             tuple of (current_count, is_allowed)
         """
         cache_key = f"ratelimit:{key}"
+        client = await self._get_client()
         
-        if self.redis_client:
+        if client:
             try:
-                current = self.redis_client.incr(cache_key)
-                if current == 1:
-                    self.redis_client.expire(cache_key, window_seconds)
+                try:
+                    current = await client.evalsha(
+                        self._rate_limit_sha, 1, cache_key, window_seconds
+                    )
+                except redis.exceptions.NoScriptError:
+                    # Script cache was flushed (e.g. Redis restart)
+                    current = await client.eval(
+                        RATE_LIMIT_SCRIPT, 1, cache_key, window_seconds
+                    )
                 return current, current <= limit
             except Exception:
                 return 0, True
         else:
             # Simple memory-based rate limiting
-            current = self.memory_cache.get(cache_key, 0) + 1
-            self.memory_cache[cache_key] = current
+            current = (self._lru_get(self._rl_cache, cache_key) or 0) + 1
+            self._lru_set(self._rl_cache, cache_key, current, MEMORY_RATE_LIMIT_MAX_ENTRIES)
             return current, current <= limit
     
-    def get_stats(self) -> dict:
+    async def _get_dbsize(self, client: "aioredis.Redis") -> int:
+        """Redis key count, reused for a few seconds across dashboard polls"""
+        now = time.monotonic()
+        if self._dbsize_cached and now - self._dbsize_cached[0] < STATS_DBSIZE_TTL_SECONDS:
+            return self._dbsize_cached[1]
+        
+        total = await client.dbsize()
+        self._dbsize_cached = (now, total)
+        return total
+    
+    async def get_stats(self) -> dict:
         """Get cache statistics"""
-        if self.redis_client:
+        client = await self._get_client()
+        
+        if client:
             try:
-                info = self.redis_client.info()
+                info = await client.info()
                 return {
                     "backend": "redis",
                     "connected": True,
                     "used_memory": info.get("used_memory_human", "unknown"),
-                    "total_keys": self.redis_client.dbsize()
+                    "total_keys": await self._get_dbsize(client)
                 }
             except Exception:
                 pass
@@ -200,7 +394,10 @@ class CacheManager:
         return {
             "backend": "memory",
             "connected": False,
-            "total_keys": len(self.memory_cache)
+            "total_keys": (
+                len(self._det_cache) + len(self._sess_cache)
+                + len(self._rl_cache) + len(self._stats_cache)
+            )
         }
 
 
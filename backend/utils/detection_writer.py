@@ -0,0 +1,142 @@
+"""
+Detection Writer - Group-committed inserts for detection history
+Saves that arrive while an insert is in flight are written together in
+one insert_many, so MongoDB acknowledges (and journals) one batch instead
+of every document. Callers still wait until their document is written.
+"""
+import asyncio
+import logging
+from typing import Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from config.database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Background write buffer (drained by a writer started with the app)
+DETECTION_QUEUE_MAX_SIZE = 5000
+DETECTION_BATCH_SIZE = 50
+DETECTION_WRITE_ATTEMPTS = 3
+DETECTION_RETRY_DELAY_SECONDS = 0.2
+# Duplicate key: the document was written by an earlier attempt
+DUPLICATE_KEY_ERROR = 11000
+_detection_queue: asyncio.Queue = asyncio.Queue(maxsize=DETECTION_QUEUE_MAX_SIZE)
+_detection_writer_task: Optional[asyncio.Task] = None
+
+
+async def save_detection(detection_doc: dict) -> ObjectId:
+    """
+    Insert a detection document, batched with concurrent saves
+    
+    Returns once the document is written; raises if it could not be.
+    Inserts inline if the writer isn't running or the buffer is full.
+    """
+    detection_doc.setdefault("_id", ObjectId())
+    
+    if _detection_writer_task is None or _detection_writer_task.done():
+        await get_database().detections.insert_one(detection_doc)
+        return detection_doc["_id"]
+    
+    written = asyncio.get_running_loop().create_future()
+    try:
+        _detection_queue.put_nowait((detection_doc, written))
+    except asyncio.QueueFull:
+        logger.warning("⚠️ Detection write buffer full, inserting inline")
+        await get_database().detections.insert_one(detection_doc)
+        return detection_doc["_id"]
+    
+    await written
+    return detection_doc["_id"]
+
+
+async def _insert_batch(batch: list):
+    """
+    insert_many a batch of (doc, future) pairs, retrying documents that failed
+    
+    Each future is resolved once its document is written, or failed with
+    the last error after DETECTION_WRITE_ATTEMPTS tries.
+    """
+    pending = batch
+    error: Optional[Exception] = None
+    
+    for attempt in range(DETECTION_WRITE_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(DETECTION_RETRY_DELAY_SECONDS * attempt)
+        try:
+            await get_database().detections.insert_many([doc for doc, _ in pending], ordered=False)
+            pending = []
+        except BulkWriteError as e:
+            error = e
+            details = e.details or {}
+            # Without write concern the whole batch is in doubt; retry all of it
+            if not details.get("writeConcernErrors"):
+                failed = {
+                    err["index"] for err in details.get("writeErrors", [])
+                    if err.get("code") != DUPLICATE_KEY_ERROR
+                }
+                pending = [item for i, item in enumerate(pending) if i in failed]
+        except Exception as e:
+            error = e
+        
+        if not pending:
+            break
+    
+    # Waiters may have gone away (request cancelled); skip their futures
+    for _, future in pending:
+        if not future.done():
+            future.set_exception(error)
+    for _, future in batch:
+        if not future.done():
+            future.set_result(None)
+    
+    if pending:
+        logger.error(f"❌ Failed to write {len(pending)} detections: {error}")
+
+
+async def _detection_writer():
+    """Write whatever queued up while the previous batch was in flight"""
+    while True:
+        batch = [await _detection_queue.get()]
+        while len(batch) < DETECTION_BATCH_SIZE and not _detection_queue.empty():
+            batch.append(_detection_queue.get_nowait())
+        
+        try:
+            await _insert_batch(batch)
+        finally:
+            for _, written in batch:
+                # Only unresolved if the writer was cancelled mid-batch
+                if not written.done():
+                    written.set_exception(RuntimeError("Detection writer stopped"))
+                _detection_queue.task_done()
+
+
+def start_detection_writer():
+    """Start the background detection writer (call on startup)"""
+    global _detection_writer_task
+    
+    if _detection_writer_task is None or _detection_writer_task.done():
+        _detection_writer_task = asyncio.create_task(_detection_writer())
+
+
+async def stop_detection_writer(timeout: float = 10.0):
+    """Flush buffered detections and stop the writer (call on shutdown)"""
+    global _detection_writer_task
+    
+    if _detection_writer_task is None:
+        return
+    
+    try:
+        await asyncio.wait_for(_detection_queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ {_detection_queue.qsize()} buffered detections not written before shutdown")
+    
+    _detection_writer_task.cancel()
+    _detection_writer_task = None
+    
+    # Anything still queued will never be written; fail its waiters
+    while not _detection_queue.empty():
+        _, written = _detection_queue.get_nowait()
+        _detection_queue.task_done()
+        if not written.done():
+            written.set_exception(RuntimeError("Detection writer stopped"))
@@ -4,7 +4,9 @@ Uses SendGrid API for production (bypasses blocked SMTP ports)
 Falls back to aiosmtplib for local development
 """
 import os
+import asyncio
 import logging
+from typing import Optional
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -16,6 +18,18 @@ settings = get_settings()
 # SendGrid API Key (set in production to bypass blocked SMTP)
 SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
 
+# Shared SMTP connection (reused across emails, guarded by a lock)
+SMTP_KEEPALIVE_SECONDS = 60
+_smtp_client: Optional[aiosmtplib.SMTP] = None
+_smtp_lock = asyncio.Lock()
+_smtp_keepalive_task: Optional[asyncio.Task] = None
+
+# Background email queue (drained by a worker started with the app)
+EMAIL_QUEUE_MAX_SIZE = 1000
+EMAIL_BATCH_SIZE = 10
+_email_queue: asyncio.Queue = asyncio.Queue(maxsize=EMAIL_QUEUE_MAX_SIZE)
+_email_worker_task: Optional[asyncio.Task] = None
+
 
 async def send_email(to_email: str, subject: str, html_content: str) -> bool:
     """
@@ -69,8 +83,124 @@ async def _send_via_sendgrid(to_email: str, subject: str, html_content: str) ->
         return False
 
 
+async def queue_email(to_email: str, subject: str, html_content: str) -> bool:
+    """
+    Queue an email for background delivery and return immediately
+    Sends inline if the worker isn't running; returns False if the queue is full
+    """
+    if _email_worker_task is None or _email_worker_task.done():
+        return await send_email(to_email, subject, html_content)
+    
+    try:
+        _email_queue.put_nowait((to_email, subject, html_content))
+        return True
+    except asyncio.QueueFull:
+        logger.error(f"❌ Email queue full, dropping email to {to_email}")
+        return False
+
+
+async def _email_worker():
+    """Drain the email queue in small batches"""
+    while True:
+        batch = [await _email_queue.get()]
+        while len(batch) < EMAIL_BATCH_SIZE and not _email_queue.empty():
+            batch.append(_email_queue.get_nowait())
+        
+        for to_email, subject, html_content in batch:
+            try:
+                await send_email(to_email, subject, html_content)
+            finally:
+                _email_queue.task_done()
+
+
+def start_email_worker():
+    """Start the background email worker (call on startup)"""
+    global _email_worker_task
+    
+    if _email_worker_task is None or _email_worker_task.done():
+        _email_worker_task = asyncio.create_task(_email_worker())
+
+
+async def stop_email_worker(timeout: float = 10.0):
+    """Flush pending emails and stop the worker (call on shutdown)"""
+    global _email_worker_task
+    
+    if _email_worker_task is None:
+        return
+    
+    try:
+        await asyncio.wait_for(_email_queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ {_email_queue.qsize()} queued emails not sent before shutdown")
+    
+    _email_worker_task.cancel()
+    _email_worker_task = None
+
+
+async def _get_smtp_client() -> aiosmtplib.SMTP:
+    """
+    Get the shared SMTP client, connecting (STARTTLS + login) if needed
+    Must be called while holding _smtp_lock
+    """
+    global _smtp_client, _smtp_keepalive_task
+    
+    if _smtp_client is None or not _smtp_client.is_connected:
+        client = aiosmtplib.SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            username=settings.smtp_user,
+            password=settings.smtp_password,
+            start_tls=True
+        )
+        await client.connect()
+        _smtp_client = client
+        logger.info(f"📡 Connected to SMTP server {settings.smtp_host}")
+    
+    if _smtp_keepalive_task is None or _smtp_keepalive_task.done():
+        _smtp_keepalive_task = asyncio.create_task(_smtp_keepalive())
+    
+    return _smtp_client
+
+
+async def _smtp_keepalive():
+    """Ping the shared SMTP connection periodically so it isn't dropped"""
+    global _smtp_client
+    
+    while True:
+        await asyncio.sleep(SMTP_KEEPALIVE_SECONDS)
+        async with _smtp_lock:
+            if _smtp_client is None:
+                return
+            try:
+                await _smtp_client.noop()
+            except aiosmtplib.SMTPException:
+                # Reconnect lazily on the next send
+                _smtp_client.close()
+                _smtp_client = None
+                return
+
+
+async def close_smtp_connection():
+    """Close the shared SMTP connection (call on shutdown)"""
+    global _smtp_client, _smtp_keepalive_task
+    
+    if _smtp_keepalive_task:
+        _smtp_keepalive_task.cancel()
+        _smtp_keepalive_task = None
+    
+    async with _smtp_lock:
+        if _smtp_client and _smtp_client.is_connected:
+            try:
+                await _smtp_client.quit()
+            except aiosmtplib.SMTPException:
+                _smtp_client.close()
+        _smtp_client = None
+
+
 async def _send_via_smtp(to_email: str, subject: str, html_content: str) -> bool:
     """Send email using SMTP (for local development)"""
+    global _smtp_client
+    
     try:
         # Create message
         message = MIMEMultipart("alternative")
@@ -82,15 +212,16 @@ async def _send_via_smtp(to_email: str, subject: str, html_content: str) -> bool
         html_part = MIMEText(html_content, "html")
         message.attach(html_part)
         
-        # Send email
-        await aiosmtplib.send(
-            message,
-            hostname=settings.smtp_host,
-            port=settings.smtp_port,
-            username=settings.smtp_user,
-            password=settings.smtp_password,
-            start_tls=True
-        )
+        # Send email over the shared connection
+        async with _smtp_lock:
+            client = await _get_smtp_client()
+            try:
+                await client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # Server dropped the idle connection - reconnect once
+                _smtp_client = None
+                client = await _get_smtp_client()
+                await client.send_message(message)
         
         logger.info(f"✉️ Email sent successfully to {to_email} via SMTP")
         return True
@@ -100,12 +231,8 @@ async def _send_via_smtp(to_email: str, subject: str, html_content: str) -> bool
         return False
 
 
-async def send_verification_email(email: str, token: str, username: str) -> bool:
-    """Send email verification link"""
-    
-    verification_url = f"{settings.frontend_url}/verify-email?token={token}"
-    
-    html_content = f"""
+# HTML templates (built once at import, filled with str.format_map)
+_VERIFY_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -136,16 +263,9 @@ async def send_verification_email(email: str, token: str, username: str) -> bool
     </body>
     </html>
     """
-    
-    return await send_email(email, "✅ Verify your email - Smart Traffic Detection", html_content)
 
 
-async def send_password_reset_email(email: str, token: str, username: str) -> bool:
-    """Send password reset link"""
-    
-    reset_url = f"{settings.frontend_url}/reset-password?token={token}"
-    
-    html_content = f"""
+_RESET_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -176,5 +296,29 @@ async def send_password_reset_email(email: str, token: str, username: str) -> bo
     </body>
     </html>
     """
+
+
+async def send_verification_email(email: str, token: str, username: str) -> bool:
+    """Send email verification link"""
+    
+    verification_url = f"{settings.frontend_url}/verify-email?token={token}"
+    
+    html_content = _VERIFY_TEMPLATE.format_map({
+        "username": username,
+        "verification_url": verification_url
+    })
+    
+    return await queue_email(email, "✅ Verify your email - Smart Traffic Detection", html_content)
+
+
+async def send_password_reset_email(email: str, token: str, username: str) -> bool:
+    """Send password reset link"""
+    
+    reset_url = f"{settings.frontend_url}/reset-password?token={token}"
+    
+    html_content = _RESET_TEMPLATE.format_map({
+        "username": username,
+        "reset_url": reset_url
+    })
     
-    return await send_email(email, "🔐 Password Reset - Smart Traffic Detection", html_content)
+    return await queue_email(email, "🔐 Password Reset - Smart Traffic Detection", html_content)
@@ -6,66 +6,65 @@ from fastapi import HTTPException, status
 
 class AppException(HTTPException):
     """Base application exception"""
-    def __init__(self, detail: str, status_code: int = 400, error_code: str = None):
-        super().__init__(status_code=status_code, detail=detail)
-        self.error_code = error_code
+    # Per-class defaults; subclasses override instead of forwarding kwargs
+    default_status_code = 400
+    error_code = None
+
+    def __init__(self, detail: str, status_code: int = None, error_code: str = None):
+        super().__init__(status_code or self.default_status_code, detail)
+        if error_code is not None:
+            self.error_code = error_code
 
 
 class AuthenticationError(AppException):
     """Authentication related errors"""
+    default_status_code = status.HTTP_401_UNAUTHORIZED
+    error_code = "AUTH_ERROR"
+
     def __init__(self, detail: str = "Authentication failed"):
-        super().__init__(
-            detail=detail,
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            error_code="AUTH_ERROR"
-        )
+        super().__init__(detail, self.default_status_code, self.error_code)
 
 
 class AuthorizationError(AppException):
     """Authorization related errors"""
+    default_status_code = status.HTTP_403_FORBIDDEN
+    error_code = "FORBIDDEN"
+
     def __init__(self, detail: str = "Access denied"):
-        super().__init__(
-            detail=detail,
-            status_code=status.HTTP_403_FORBIDDEN,
-            error_code="FORBIDDEN"
-        )
+        super().__init__(detail, self.default_status_code, self.error_code)
 
 
 class NotFoundError(AppException):
     """Resource not found errors"""
+    default_status_code = status.HTTP_404_NOT_FOUND
+    error_code = "NOT_FOUND"
+
     def __init__(self, resource: str = "Resource"):
-        super().__init__(
-            detail=f"{resource} not found",
-            status_code=status.HTTP_404_NOT_FOUND,
-            error_code="NOT_FOUND"
-        )
+        super().__init__(f"{resource} not found", self.default_status_code, self.error_code)
 
 
 class ValidationError(AppException):
     """Validation errors"""
+    default_status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    error_code = "VALIDATION_ERROR"
+
     def __init__(self, detail: str = "Validation failed"):
-        super().__init__(
-            detail=detail,
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            error_code="VALIDATION_ERROR"
-        )
+        super().__init__(detail, self.default_status_code, self.error_code)
 
 
 class DuplicateError(AppException):
     """Duplicate resource errors"""
+    default_status_code = status.HTTP_409_CONFLICT
+    error_code = "DUPLICATE"
+
     def __init__(self, field: str = "Resource"):
-        super().__init__(
-            detail=f"{field} already exists",
-            status_code=status.HTTP_409_CONFLICT,
-            error_code="DUPLICATE"
-        )
+        super().__init__(f"{field} already exists", self.default_status_code, self.error_code)
 
 
 class DatabaseError(AppException):
     """Database operation errors"""
+    default_status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    error_code = "DB_ERROR"
+
     def __init__(self, detail: str = "Database operation failed"):
-        super().__init__(
-            detail=detail,
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            error_code="DB_ERROR"
-        )
+        super().__init__(detail, self.default_status_code, self.error_code)
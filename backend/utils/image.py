@@ -0,0 +1,160 @@
+"""
+Image decoding and resizing helpers
+Uses libjpeg-turbo for JPEG uploads when available, OpenCV otherwise
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+import cv2
+from fastapi import HTTPException, UploadFile, status
+
+logger = logging.getLogger(__name__)
+
+# Check if PyTurboJPEG and the libturbojpeg shared library are available
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _jpeg = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    _jpeg = None
+    TURBOJPEG_AVAILABLE = False
+
+# JPEG files start with the SOI marker
+JPEG_MAGIC = b"\xff\xd8"
+
+# EXIF Orientation tag (1 = upright, no transform needed)
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Upload limits
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an uploaded file in chunks, rejecting it once it exceeds max_bytes
+
+    Raises:
+        HTTPException: 413 if the upload is too large
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Image exceeds {max_bytes // (1024 * 1024)} MB limit"
+    )
+
+    # Multipart parsing already knows the size; reject without reading
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise too_large
+
+    return bytes(buffer)
+
+
+def jpeg_orientation(contents: bytes) -> int:
+    """
+    Read the EXIF Orientation of a JPEG from its APP1 segment
+
+    Returns:
+        Orientation value 1-8, or 1 if the file has no (readable) tag
+    """
+    offset = 2
+    while offset + 4 <= len(contents) and contents[offset] == 0xFF:
+        marker = contents[offset + 1]
+        length = int.from_bytes(contents[offset + 2:offset + 4], "big")
+        # Image data starts at SOS; EXIF always comes before it
+        if marker == 0xDA or length < 2:
+            break
+
+        segment = contents[offset + 4:offset + 2 + length]
+        if marker == 0xE1 and segment[:6] == b"Exif\0\0":
+            return _tiff_orientation(segment[6:])
+        offset += 2 + length
+
+    return 1
+
+
+def _tiff_orientation(tiff: bytes) -> int:
+    """Find the Orientation entry in IFD0 of an EXIF TIFF block"""
+    byteorder = {b"II": "little", b"MM": "big"}.get(tiff[:2])
+    if byteorder is None:
+        return 1
+
+    ifd = int.from_bytes(tiff[4:8], byteorder)
+    if ifd + 2 > len(tiff):
+        return 1
+
+    count = int.from_bytes(tiff[ifd:ifd + 2], byteorder)
+    for entry in range(ifd + 2, min(ifd + 2 + count * 12, len(tiff) - 11), 12):
+        if int.from_bytes(tiff[entry:entry + 2], byteorder) == EXIF_ORIENTATION_TAG:
+            return int.from_bytes(tiff[entry + 8:entry + 10], byteorder)
+
+    return 1
+
+
+def decode_image(contents: bytes) -> Optional[np.ndarray]:
+    """
+    Decode uploaded image bytes to a BGR array
+
+    Args:
+        contents: Raw image file bytes
+
+    Returns:
+        BGR image array, or None if the bytes are not a valid image
+    """
+    # TurboJPEG ignores EXIF Orientation; OpenCV applies it, so rotated
+    # phone photos go through OpenCV
+    if TURBOJPEG_AVAILABLE and contents[:2] == JPEG_MAGIC and jpeg_orientation(contents) == 1:
+        try:
+            return _jpeg.decode(contents, pixel_format=TJPF_BGR)
+        except Exception as e:
+            # Truncated or unusual JPEGs: let OpenCV have a go
+            logger.debug(f"TurboJPEG decode failed, falling back to OpenCV: {e}")
+
+    nparr = np.frombuffer(contents, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def downscale_to_max_edge(image: np.ndarray, max_edge: int) -> np.ndarray:
+    """
+    Shrink an image so its longest edge is at most max_edge pixels
+
+    Args:
+        image: Image array (H, W[, C])
+        max_edge: Longest allowed edge in pixels
+
+    Returns:
+        The resized image, or the input unchanged if already small enough
+    """
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale >= 1:
+        return image
+
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def dhash(image: np.ndarray) -> int:
+    """
+    64-bit difference hash of an image
+
+    Near-identical images (re-uploads, static scenes) land within a few
+    bits of each other; compare with (a ^ b).bit_count().
+
+    Args:
+        image: BGR or grayscale image array
+
+    Returns:
+        Hash as a Python int
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")